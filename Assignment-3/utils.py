@@ -2,8 +2,6 @@ import numpy as np
 from matplotlib import pyplot as plt
 import matplotlib as mpl
 import seaborn as sns
-from math import floor
-from tqdm import tqdm_notebook as tqdm
 import pandas as pd
 
 def get_songs_albums_artists(df):
@@ -12,6 +10,160 @@ def get_songs_albums_artists(df):
     n_artists = df.artist_id.nunique()
     return n_songs, n_albums, n_artists
 ##########################################################################################################################
+# Streaming: the same statistics over csv files larger than memory
+##########################################################################################################################
+# compact dtypes of the columns of music.csv (not listed: float64)
+music_dtypes = {
+    'artist.id': 'category',
+    'artist.name': 'category',
+    'artist_mbtags': 'category',
+    'location': 'category',
+    'release.id': 'int32',
+    'release.name': 'category',
+    'similar': 'category',
+    'song.id': 'category',
+    'terms': 'category',
+    'title': 'category',
+    'year': 'int16',
+    'mode': 'int8',
+}
+
+def read_chunks(path, columns, chunksize=100000, dtype=music_dtypes):
+    """
+    Yields the csv by chunks of `chunksize` rows, with only the given columns
+    (named as in the csv, e.g. 'release.id') and compact dtypes.
+    Columns of the chunks are named as in the notebook ('release_id').
+    """
+    dtype = {column: dtype[column] for column in columns if column in dtype}
+    for chunk in pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize):
+        chunk.columns = chunk.columns.map(lambda s: s.replace('.', '_'))
+        yield chunk
+
+def get_unique(values):
+    if hasattr(values, 'cat'):
+        values = values[values.notna()].cat.remove_unused_categories().cat.categories
+    return values.dropna().unique()
+
+def get_songs_albums_artists_streaming(path, where=None, columns=(), chunksize=100000):
+    """
+    get_songs_albums_artists over a csv read by chunks: memory is bounded by
+    the chunk size and the number of distinct albums and artists (the unique
+    counts are exact). `where(chunk)` selects rows, e.g.
+    lambda chunk: chunk.year > 1975, over the additional `columns`.
+    """
+    n_songs, albums, artists = 0, set(), set()
+    for chunk in read_chunks(path, ['release.id', 'artist.id'] + list(columns), chunksize):
+        if where is not None:
+            chunk = chunk[where(chunk)]
+        n_songs += chunk.shape[0]
+        albums.update(get_unique(chunk.release_id))
+        artists.update(get_unique(chunk.artist_id))
+    return n_songs, len(albums), len(artists)
+
+class HeavyHitters:
+    """
+    Misra-Gries summary (mergeable version, Agarwal et al., 2012) of the most
+    frequent values of a stream, in at most k counters. Counts are
+    underestimated by at most `error` <= n / (k + 1), so every value more
+    frequent than that is kept. Exact while there are at most k distinct
+    values. Small updates are buffered and counted `batch` values at a time;
+    n, error and counters are those of the values counted so far (see flush).
+        words = HeavyHitters(1000)
+        for tokens in normalize_all(titles):
+            words.update(tokens)
+        frequency(frequencies=words, min_freq_to_show=200)
+    """
+    def __init__(self, k=1000, batch=100000):
+        self.k = k
+        self.batch = batch
+        self.n = 0
+        self.error = 0
+        self.counters = pd.Series([], dtype=np.int64)
+        self._pending = []
+
+    def _add(self, counts):
+        counters = self.counters.add(counts, fill_value=0).astype(np.int64)
+        if len(counters) > self.k:
+            # all counters minus the (k + 1)-th largest, the non-positive dropped
+            threshold = counters.nlargest(self.k + 1).iloc[-1]
+            counters = counters[counters > threshold] - threshold
+            self.error += threshold
+        self.counters = counters
+
+    def _count(self, values):
+        counts = pd.Series(values).value_counts()
+        counts = counts[counts > 0]
+        self.n += int(counts.sum())
+        self._add(counts)
+
+    def update(self, values):
+        """
+        Counts values (NaN excluded): a Series or array as a chunk at once,
+        other iterables (e.g. the tokens of a title) once `batch` values are
+        pending, as a single chunk.
+        """
+        if isinstance(values, (pd.Series, np.ndarray)):
+            self._count(values)
+            return self
+        self._pending.extend(values)
+        if len(self._pending) >= self.batch:
+            self.flush()
+        return self
+
+    def flush(self):
+        """
+        Counts the pending values.
+        """
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._count(pd.Series(pending, dtype=object))
+        return self
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.n += other.n
+        self.error += other.error
+        self._add(other.counters)
+        return self
+
+    def counts(self):
+        """
+        Lower bounds of the counts of the kept values, largest first (the
+        upper bounds are `error` more), pending values included.
+        """
+        self.flush()
+        return self.counters.sort_values(ascending=False)
+
+def heavy_hitters_streaming(path, by, k=1000, chunksize=100000):
+    """
+    HeavyHitters of a column of a csv read by chunks (named as in the csv).
+    """
+    heavy_hitters = HeavyHitters(k)
+    for chunk in read_chunks(path, [by], chunksize):
+        heavy_hitters.update(chunk[by.replace('.', '_')])
+    return heavy_hitters
+
+def frequencies_streaming(path, by, aux=None, chunksize=100000):
+    """
+    The frequencies plotted by `frequency` (count of rows per value of `by`,
+    or of distinct `aux` values if given) over a csv read by chunks, as
+    running group counts. Columns are named as in the csv.
+    """
+    by_name, aux_name = by.replace('.', '_'), aux.replace('.', '_') if aux is not None else None
+    frequencies = pd.Series([], dtype=np.int64)
+    pairs = set()
+    for chunk in read_chunks(path, [by] + ([aux] if aux is not None else []), chunksize):
+        if aux is None:
+            counts = chunk[by_name].value_counts()
+            frequencies = frequencies.add(counts[counts > 0].astype(np.int64), fill_value=0)
+        else:
+            chunk = chunk.dropna().drop_duplicates()
+            pairs.update(zip(chunk[by_name].astype(object), chunk[aux_name].astype(object)))
+    if aux is not None:
+        frequencies = pd.Series([value for value, _ in pairs], dtype=object).value_counts()
+    return frequencies.astype(np.int64).sort_values(ascending=False)
+##########################################################################################################################
 # Templates
 ##########################################################################################################################
 def template_vis():
@@ -32,24 +184,126 @@ def plt_captions(title='', xlabel='', ylabel='', titlesize=22, labelsize=18):
 ##########################################################################################################################
 three_colors = ['#554DD2', '#C21D90', '#4ABDC2']
 
-def frequency(df=None, by=None, aux=None, series=None, min_freq_to_show=2, figsize=(20,6)):
+def frequency(df=None, by=None, aux=None, series=None, min_freq_to_show=2, figsize=(20,6), frequencies=None):
+    # frequencies: precomputed, e.g. by frequencies_streaming, or HeavyHitters
+    # (values possibly above min_freq_to_show are shown, with their error bounds)
     mpl.rcParams['figure.figsize'] = figsize
     c = np.random.choice(three_colors) 
-    if aux is None:
+    error = 0
+    if isinstance(frequencies, HeavyHitters):
+        frequencies, error = frequencies.counts(), frequencies.error
+    if frequencies is None and aux is None:
         if series is None:
             series = df[by]
         frequencies = series.groupby(series).count().sort_values(ascending=False)
-    else:
+    elif frequencies is None:
         frequencies = df.groupby(df[by])[aux].nunique().sort_values(ascending=False)
-    temp = frequencies[frequencies > min_freq_to_show]
-    plt.bar(temp.index, temp.values, color=c, linewidth=0, alpha=0.7)
+    temp = frequencies[frequencies + error > min_freq_to_show]
+    yerr = [np.zeros(len(temp)), np.full(len(temp), error)] if error else None
+    plt.bar(temp.index, temp.values, yerr=yerr, color=c, linewidth=0, alpha=0.7, ecolor='white')
+
+
+# samples larger than this are plotted from their aggregates (aggregate=None)
+AGGREGATE_MIN_POINTS = 100000
+# bins of the aggregated histograms: as 'sqrt', up to this many
+AGGREGATE_MAX_BINS = 256
+
+def is_aggregated(sample, aggregate=None):
+    if isinstance(sample, QuantileSketch):
+        return True
+    return len(sample) > AGGREGATE_MIN_POINTS if aggregate is None else aggregate
+
+def kde_fft(values, weights=None, gridsize=1024, cut=3):
+    """
+    Gaussian KDE (Scott's bandwidth, as seaborn) of a weighted sample on a
+    grid of `gridsize` points: the sample is binned on the grid and the
+    counts convolved with the kernel by FFT. Returns (grid, density).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+    n = weights.sum()
+    mean = np.dot(weights, values) / n
+    std = np.sqrt(np.dot(weights, (values - mean) ** 2) / n)
+    bandwidth = std * n ** (-1 / 5) if std > 0 else 1.0
+    grid = np.linspace(values.min() - cut * bandwidth, values.max() + cut * bandwidth, gridsize)
+    step = grid[1] - grid[0]
+    counts, _ = np.histogram(values, gridsize, (grid[0] - step / 2, grid[-1] + step / 2), weights=weights)
+    offsets = np.arange(-(gridsize - 1), gridsize) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    size = 2 ** int(np.ceil(np.log2(3 * gridsize)))
+    density = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)[gridsize - 1:2 * gridsize - 1]
+    density = np.maximum(density, 0)
+    return grid, density / (density.sum() * step)
+
+def box_stats(sample, whis=1.5):
+    """
+    Statistics of a box plot (as taken by Axes.bxp) of a sample, as
+    matplotlib computes them, with one partition.
+    """
+    x = np.asarray(sample, dtype=np.float64)
+    x = x[np.isfinite(x)]
+    q1, med, q3 = np.percentile(x, [25, 50, 75])
+    inside = x[(x >= q1 - whis * (q3 - q1)) & (x <= q3 + whis * (q3 - q1))]
+    return {'med': med, 'q1': q1, 'q3': q3, 'fliers': [],
+            'whislo': inside.min() if len(inside) else q1, 'whishi': inside.max() if len(inside) else q3}
+
+def stratified_sample(sample, max_points=2000, bins=50, seed=None):
+    """
+    About max_points values of a sample, drawn at random in each of `bins`
+    value ranges in proportion to its count (rounded up, so that the tails
+    stay visible), in one pass.
+    """
+    x = np.asarray(sample, dtype=np.float64)
+    x = x[np.isfinite(x)]
+    if len(x) <= max_points:
+        return x
+    edges = np.histogram_bin_edges(x, bins)
+    strata = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+    counts = np.bincount(strata, minlength=bins)
+    quotas = np.ceil(counts * max_points / len(x))
+    rates = quotas / np.maximum(counts, 1)
+    return x[np.random.RandomState(seed).random_sample(len(x)) < rates[strata]]
+
+def distplot(sample, ax=None, norm_hist=True, color=None, aggregate=None):
+    # sample: the values, or their QuantileSketch; aggregated, only the
+    # histogram counts and the KDE curve reach matplotlib
+    if not is_aggregated(sample, aggregate):
+        sns.distplot(sample, ax=ax, bins='sqrt', norm_hist=norm_hist, color=color)
+        return
+    ax = plt.gca() if ax is None else ax
+    if isinstance(sample, QuantileSketch):
+        values, weights = sample.items()
+        counts, edges = sample.histogram('sqrt')
+    else:
+        values, weights = np.asarray(sample, dtype=np.float64), None
+        values = values[np.isfinite(values)]
+        counts, edges = np.histogram(values, min(int(np.ceil(np.sqrt(len(values)))), AGGREGATE_MAX_BINS))
+    # a density histogram, as sns.distplot draws it with its KDE, in one patch
+    ax.hist(edges[:-1], edges, weights=counts, density=True, histtype='stepfilled', color=color, alpha=0.4)
+    ax.plot(*kde_fft(values, weights), color=color)
 
+def boxplot(sample, ax, color, aggregate=None):
+    if not is_aggregated(sample, aggregate):
+        sns.boxplot(sample, fliersize=0, whis=1.5, ax=ax, color=color)
+        return
+    stats = sample.box_stats(1.5) if isinstance(sample, QuantileSketch) else box_stats(sample, 1.5)
+    ax.bxp([stats], positions=[0], widths=0.8, vert=False, showfliers=False, patch_artist=True,
+           boxprops={'facecolor': color}, medianprops={'color': '#101010'})
 
-def plot_histogram(sample, ax=None, xmin=None, xmax=None, nx=None, norm_hist=True, figsize=(20,8), title='', titlesize=20):
+def plot_strip(sample, ax, aggregate=None):
+    # aggregated: a stratified sample of the points; none for a QuantileSketch
+    if isinstance(sample, QuantileSketch):
+        return
+    if is_aggregated(sample, aggregate):
+        sample = stratified_sample(sample)
+    sns.stripplot(sample, color="orange", jitter=0.2, size=3, ax=ax)
+
+def plot_histogram(sample, ax=None, xmin=None, xmax=None, nx=None, norm_hist=True, figsize=(20,8), title='', titlesize=20,
+                   aggregate=None):
     mpl.rcParams['figure.figsize'] = figsize
     c = np.random.choice(three_colors) 
     if ax is None:
-        sns.distplot(sample, bins='sqrt', norm_hist=norm_hist, color=c)
+        distplot(sample, norm_hist=norm_hist, color=c, aggregate=aggregate)
         if nx is not None:
             plt.xaxis.set_major_locator(plt.MaxNLocator(nx))
         if xmin is not None:
@@ -57,7 +311,7 @@ def plot_histogram(sample, ax=None, xmin=None, xmax=None, nx=None, norm_hist=Tru
         if xmax is not None:
             plt.set_xlim(right=xmax)
     else:
-        sns.distplot(sample, ax=ax, bins='sqrt', norm_hist=norm_hist, color=c)
+        distplot(sample, ax=ax, norm_hist=norm_hist, color=c, aggregate=aggregate)
         if nx is not None:
             ax.xaxis.set_major_locator(plt.MaxNLocator(nx))
         if xmin is not None:
@@ -74,13 +328,15 @@ def plot_histogram(sample, ax=None, xmin=None, xmax=None, nx=None, norm_hist=Tru
 
 
 def represent_distribution(sample, xmin=None, xmax=None, nx=None, stripplot=False,
-                           kind='01', norm_hist=True, figsize=(20,8), title='', titlesize=20):
+                           kind='01', norm_hist=True, figsize=(20,8), title='', titlesize=20, aggregate=None):
+    # sample: the values, or their QuantileSketch (without stripplot then);
+    # aggregate: plot from aggregates only (default: for large samples)
     mpl.rcParams['figure.figsize'] = figsize
     if kind == '0':
         f, ax_box = plt.subplots(1)
-        sns.boxplot(sample, fliersize=0, whis=1.5, ax=ax_box, color=three_colors[2])
+        boxplot(sample, ax_box, three_colors[2], aggregate)
         if stripplot:
-            sns.stripplot(sample, color="orange", jitter=0.2, size=3, ax=ax_box)
+            plot_strip(sample, ax_box, aggregate)
         ax_box.set_facecolor("#101010")
         ax_box.grid(False)
         ax_box.set(xlabel='')        
@@ -93,9 +349,9 @@ def represent_distribution(sample, xmin=None, xmax=None, nx=None, stripplot=Fals
         if kind == '01':
             f, (ax_box, ax_hist) = plt.subplots(2, sharex=True,
                                                 gridspec_kw={"height_ratios": (.15, .85)})
-            sns.boxplot(sample, fliersize=0, whis=1.5, ax=ax_box, color=three_colors[1])
+            boxplot(sample, ax_box, three_colors[1], aggregate)
             if stripplot:
-                sns.stripplot(sample, color="orange", jitter=0.2, size=3, ax=ax_box)
+                plot_strip(sample, ax_box, aggregate)
             ax_box.set_facecolor("#101010")
             ax_box.grid(False)
             ax_box.set(xlabel='')
@@ -107,7 +363,7 @@ def represent_distribution(sample, xmin=None, xmax=None, nx=None, stripplot=Fals
         else:
             f, ax_hist = plt.subplots(1)
             ax_hist.set_title(title, alpha=0.8, fontsize=titlesize, pad=10)
-        sns.distplot(sample, ax=ax_hist, bins='sqrt', norm_hist=norm_hist, color=three_colors[2])
+        distplot(sample, ax=ax_hist, norm_hist=norm_hist, color=three_colors[2], aggregate=aggregate)
         if nx is not None:
             ax_hist.xaxis.set_major_locator(plt.MaxNLocator(nx))
         if xmin is not None:
@@ -122,21 +378,135 @@ def p_quantile(x, p):
     """
     0 <= p <= 1
     """
-    x = sorted(x)
+    return p_quantiles(x, [p])[0]
+
+##########################################################################################################################
+# Quantiles
+##########################################################################################################################
+def p_quantiles(x, ps):
+    """
+    The p_quantile of x for every p of ps (0 <= p <= 1), from one partition
+    of x: the mean of the two middle values when n * p is a whole number,
+    the value of rank floor(n * p) otherwise.
+    """
+    x = np.asarray(x, dtype=np.float64)
     n = len(x)
-    
-    m = n * p
-    if m % 1 == 0:
-        m = int(m)
-        return (x[m-1] + x[m]) / 2
-    else:
-        return x[int(floor(m))]
+    m = n * np.asarray(ps, dtype=np.float64)
+    whole = m % 1 == 0
+    upper = np.floor(m).astype(np.intp)
+    lower = np.where(whole, upper - 1, upper)
+    # p = 0 and p = 1: the min and the max
+    lower, upper = np.clip(lower, 0, n - 1), np.clip(upper, 0, n - 1)
+    x = np.partition(x, np.unique(np.concatenate([lower, upper])))
+    return (x[lower] + x[upper]) / 2
+
+class QuantileSketch:
+    """
+    KLL sketch (Karnin, Lang, Liberty, 2016) of a sample too large to keep or
+    arriving by chunks: quantiles with a rank error of the order of 2 / k
+    (1-2% for k=200), in O(k) memory. Sketches of parts of a sample
+    merge into the sketch of the whole.
+        sketch = QuantileSketch()
+        for chunk in read_chunks('music.csv', ['tempo']):
+            sketch.update(chunk.tempo)
+        sketch.quantiles([0.25, 0.5, 0.75])
+    """
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        # compactors[h]: items of weight 2 ** h
+        self.compactors = [np.empty(0)]
+        self.random = np.random.RandomState(seed)
+
+    def capacity(self, h):
+        return max(int(np.ceil(self.k * (2 / 3) ** (len(self.compactors) - 1 - h))), 2)
+
+    def compress(self):
+        h = 0
+        while h < len(self.compactors):
+            if len(self.compactors[h]) > self.capacity(h):
+                if h + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(self.compactors[h])
+                # an odd item out stays, the others are halved at random
+                kept, items = items[:len(items) % 2], items[len(items) % 2:]
+                self.compactors[h + 1] = np.concatenate([self.compactors[h + 1],
+                                                         items[self.random.randint(2)::2]])
+                self.compactors[h] = kept
+                h = 0 # capacities shrink as levels are added
+            else:
+                h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.min, self.max = min(self.min, values.min()), max(self.max, values.max())
+            self.compactors[0] = np.concatenate([self.compactors[0], values])
+            self.compress()
+        return self
+
+    def merge(self, other):
+        self.n += other.n
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        for h, items in enumerate(other.compactors):
+            if h == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            self.compactors[h] = np.concatenate([self.compactors[h], items])
+        self.compress()
+        return self
+
+    def items(self):
+        """
+        The retained items, sorted, and their weights.
+        """
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(self.compactors)])
+        order = np.argsort(items, kind='mergesort')
+        return items[order], weights[order]
+
+    def quantiles(self, ps):
+        items, weights = self.items()
+        ranks = np.cumsum(weights)
+        ps = np.asarray(ps, dtype=np.float64)
+        values = items[np.minimum(np.searchsorted(ranks, ps * ranks[-1], side='left'), len(items) - 1)]
+        # the extremes are exact
+        return np.where(ps <= 0, self.min, np.where(ps >= 1, self.max, values))
+
+    def histogram(self, bins='sqrt'):
+        """
+        Estimated (counts, bin_edges) of the sample; a bin estimator of
+        np.histogram applies to the retained items.
+        """
+        items, weights = self.items()
+        edges = np.histogram_bin_edges(items, bins, range=(self.min, self.max))
+        counts, edges = np.histogram(items, edges, weights=weights)
+        return counts * (self.n / weights.sum()), edges
+
+    def box_stats(self, whis=1.5):
+        """
+        Statistics of a box plot (as taken by Axes.bxp), whiskers at whis
+        times the interquartile range.
+        """
+        q1, med, q3 = self.quantiles([0.25, 0.5, 0.75])
+        items, _ = self.items()
+        low = items[items >= q1 - whis * (q3 - q1)]
+        high = items[items <= q3 + whis * (q3 - q1)]
+        return {'med': med, 'q1': q1, 'q3': q3, 'fliers': [],
+                'whislo': max(self.min, low[0] if len(low) else q1),
+                'whishi': min(self.max, high[-1] if len(high) else q3)}
 
 ##########################################################################################################################
 # Text processing
 ##########################################################################################################################
+import os
 import re
 import nltk
+from functools import lru_cache
+from multiprocessing import Pool
 # nltk.download('punkt')
 from nltk import (
     sent_tokenize as splitter, # text => [sentences]
@@ -167,9 +537,75 @@ def clean_tokens(tokens_list):
 
 from nltk.corpus import stopwords
 # nltk.download('stopwords')
+@lru_cache(maxsize=None)
+def get_stopwords(languages=None):
+    # languages: a language, a tuple of them or None for all
+    if isinstance(languages, tuple):
+        languages = list(languages)
+    return frozenset(word.lower() for word in stopwords.words(languages))
+
 def remove_stopwords(tokens_list, languages=None):
-    return [token for token in tqdm(tokens_list)
-                if not token.lower() in stopwords.words(languages)]
+    if isinstance(languages, list):
+        languages = tuple(languages)
+    words = get_stopwords(languages)
+    return [token for token in tokens_list if not token.lower() in words]
+
+##########################################################################################################################
+# Text processing pipeline: tokenize and clean in one pass, over a process pool for large corpora
+##########################################################################################################################
+digits_regex = re.compile(r"[-+]?\d+(\.[0-9]*)?$")
+
+def is_clean(token):
+    # the filters of clean_tokens, as one predicate
+    return token.isalpha() and not digits_regex.match(token) and token != "#"
+
+def normalize(text, stopwords_set=frozenset()):
+    """
+    clean_tokens(tokenize_flatten(text)) without the stopwords, as a generator.
+    """
+    for sentence in splitter(text):
+        for token in tokenizer(sentence):
+            if is_clean(token) and token.lower() not in stopwords_set:
+                yield token
+
+_worker_stopwords = frozenset()
+
+def _init_worker(stopwords_set):
+    global _worker_stopwords
+    _worker_stopwords = stopwords_set
+
+def _normalize_list(text):
+    return list(normalize(text, _worker_stopwords))
+
+def normalize_all(texts, languages=None, remove=False, processes=1, chunksize=1000):
+    """
+    Yields the cleaned tokens of every text (without the stopwords of
+    `languages` if remove), in order, over `processes` processes.
+    """
+    if isinstance(languages, list):
+        languages = tuple(languages)
+    stopwords_set = get_stopwords(languages) if remove else frozenset()
+    if processes == 1:
+        for text in texts:
+            yield list(normalize(text, stopwords_set))
+    else:
+        with Pool(processes, _init_worker, (stopwords_set,)) as pool:
+            yield from pool.imap(_normalize_list, texts, chunksize)
+
+def get_title_words(titles, languages=None, processes=1, path=None):
+    """
+    The capitalized words of every title (each once per title) that are not
+    stopwords, as a Series. If `path` is given, the result is stored there
+    as a pickle and read from it on later calls.
+    """
+    if path is not None and os.path.exists(path):
+        return pd.read_pickle(path)
+    words = pd.Series([word.capitalize()
+                       for tokens in normalize_all(titles, languages, True, processes)
+                       for word in dict.fromkeys(tokens)])
+    if path is not None:
+        words.to_pickle(path)
+    return words
     
     
 ##########################################################################################################################
@@ -238,9 +674,27 @@ tags_mapping.update({
 'world': ['world', 'french', 'brazilian', 'canadian', 'colombian', 'german', 'greek', 'norwegian', 'southern', 'spanish', 'swedish', 'barbadian', 'birmingham', 'irish', 'italian', 'latin', 'latvian', 'lebanese', 'malian', 'northern', 'czech', 'deutschland', 'scottish', 'taiwanese', 'toronto', 'finnish'],
 'trance': ['trip', 'trance'],
 })
-tags_inverse_mapping = {}
-for key in tags_mapping:
-    for value in tags_mapping[key]:
-        tags_inverse_mapping[value] = key
-tags_inverse_mapping
+# token (or whole multi-token tag) => genre
+tags_inverse_mapping = {value: key for key in tags_mapping for value in tags_mapping[key]}
+
+def normalize_tags(tags, mapping=tags_inverse_mapping, other=None):
+    """
+    The genres of a column of tags (artist_mbtags, terms) as a categorical:
+    a tag is looked up in the mapping as a whole, then by its first token
+    (as shorten_tag). Tags outside the mapping become `other`, or keep their
+    first token if it is None. The work is done once per distinct tag and
+    broadcast back to the rows by category codes.
+    """
+    tags = pd.Series(tags)
+    if not hasattr(tags, 'cat'):
+        tags = tags.astype('category')
+    categories = pd.Series(tags.cat.categories)
+    # '' for empty or blank tags, as shorten_tag
+    first = categories.str.split(n=1).str[0].fillna('')
+    genres = categories.map(mapping).fillna(first.map(mapping))
+    genres = genres.fillna(first if other is None else other)
+    genre_codes, genre_categories = pd.factorize(genres, sort=True)
+    # code -1 (missing tag) stays -1
+    codes = np.append(genre_codes, -1)[tags.cat.codes.values]
+    return pd.Series(pd.Categorical.from_codes(codes, genre_categories), index=tags.index, name=tags.name)
     
\ No newline at end of file
@@ -1,61 +1,50 @@
+from profile_utils import startup
+startup.trace_imports()
+
+import flask
 import dash
+from flask_compress import Compress
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
 
-import numpy as np
 import pandas as pd
+from functools import lru_cache
 
-from data_utils import get_data
+from data_utils import get_data, get_reloader
+from indicators import indicators
+from cache_utils import get_response_cache, cache_callbacks
+from json_utils import serialize_callbacks
+from geo_utils import serve_geometry
+from warmup_utils import get_warmup
+from metrics_utils import Metrics, instrument_callbacks
 from app_utils import get_choropleth, get_histogram, get_general_plot
-from app_utils import mapbox_access_token, scl1, scl2
+from app_utils import get_frames
+from app_utils import mapbox_access_token, colorscales
 
 # Dash App
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets,
-                meta_tags=[{"content": "width=device-width"}])
+                meta_tags=[{"content": "width=device-width"}], compress=False)
 server = app.server
+# Brotli for the browsers that accept it, gzip otherwise
+server.config.update(COMPRESS_ALGORITHM=['br', 'gzip'], COMPRESS_LEVEL=6, COMPRESS_BR_LEVEL=5)
+Compress(server)
 
-# Data
-dfs, dfs_continents, codes, names = get_data()
-available_datatypes = {
-    'fertility': "Fertility Rate",
-    'life': "Life Expectancy",
-    'population': "Population",
-    'birth': "Birth Rate",
-    'death': "Death Rate"
-}
-descriptions = {
-    'fertility': """
-    Fertility Rate is the number of children that would be born to a woman if
-    she were to live to the end of her childbearing years and
-    bear children in accordance with age-specific fertility
-    rates of the specified year.
-    """,
-    'life': """
-    Life Expectancy is the number of years a newborn infant would live if prevailing
-    patterns of mortality at the time of its birth were to stay the
-    same throughout its life.
-    """,
-    'population': """
-    Population counts all residents regardless of legal status or
-    citizenship. The values are midyear estimates.
-    """,
-    'birth': """
-    Birth Rate is the number of live births occurring during the year,
-    per 1,000 population estimated at midyear.
-    """,
-    'death': """
-    Death Rate is the number of deaths occurring during the year,
-    per 1,000 population estimated at midyear.
-    """
-}
+# Data (indicators are loaded lazily, see indicators.py). The reloader swaps
+# in new data when the CSVs change: callbacks take `data.cube` once, so that
+# they work on a single version of it.
+data = get_reloader(get_data())
+codes = data.cube.codes
+available_datatypes = {key: indicator['label'] for key, indicator in indicators.items()}
+descriptions = {key: indicator['description'] for key, indicator in indicators.items()}
 
 # Text
 title = html.H1("World Demography")
 subtitle = html.Div([html.P(
-    """Demographic situation in the 185 countries over the last 50 years."""),
+    """Demographic situation in the {} countries over the last 50 years.""".format(len(codes))),
     html.Br()])
 source = dcc.Markdown(children=[
     "Source: [World Bank Open Data](https://data.worldbank.org)"
@@ -79,17 +68,22 @@ logscale_flag = html.Div([dcc.Checklist(
             'display': 'inline-block',
     })
 # Years
-playbutton = html.Button(children='Play', id='playbutton', title="right", style={
+playbutton = html.Button(children='Play', id='playbutton', style={
     'display': 'inline-block',
     "margin-right": "1em",
     })
+first_year, last_year = int(data.cube.years[0]), int(data.cube.years[-1])
 years_slider = dcc.Slider(id='years_slider',
-        min=1960, max=2016, value=1960, step=1,
-        marks={str(year): str(year) for year in np.arange(1960,2020,10)})
+        min=first_year, max=last_year, value=first_year, step=1,
+        marks={str(year): str(year) for year in range(first_year + -first_year % 10, last_year + 1, 10)})
 # General-Plot
 general_plot = dcc.Graph(id='general_plot')
-# Choropleth Map
-choropleth = dcc.Graph(id='choropleth')
+# Choropleth Map, with the country geometry served by the app when available
+if serve_geometry(server, app.config.routes_pathname_prefix + 'geo/'):
+    choropleth_config = {'topojsonURL': app.config.requests_pathname_prefix + 'geo/'}
+else:
+    choropleth_config = {}
+choropleth = dcc.Graph(id='choropleth', config=choropleth_config)
 # Histogram
 histogram = dcc.Graph(id='histogram')
 
@@ -117,11 +111,31 @@ first_block = html.Div(
         dcc.Interval(
             id='interval',
             interval=800, # in milliseconds
-            n_intervals=0),
+            n_intervals=0,
+            disabled=True),
+        # Figures are assembled in the browser (assets/animation.js):
+        # `templates` holds the static figures of the current indicator,
+        # `figures` the values of the selected year, `frames` those of all
+        # years for Play mode and `animation` the displayed year; all of them
+        # carry the version of the data they come from
+        dcc.Store(id='templates'),
+        # the view of the templates, and the view they are refetched for
+        # when they are of another view or of older data (see update_figures)
+        dcc.Store(id='templates_view'),
+        dcc.Store(id='templates_request'),
+        dcc.Store(id='figures'),
+        dcc.Store(id='frames'),
+        dcc.Store(id='animation'),
+        # countries in the value range selected on the histogram
+        dcc.Store(id='selection'),
         html.Br(),
         html.Br(),
         html.Div(id="aggregation"),
         html.Br(),
+        html.Div(id="top_countries"),
+        html.Br(),
+        html.Div(id="selection_summary"),
+        html.Br(),
         source
     ]
 )
@@ -136,55 +150,141 @@ second_block = html.Div(
 
 app.layout = html.Div(className="row", children=[first_block, second_block])
 
+# Points of the trend plot, about two per pixel of the widest plot (longer
+# series are downsampled, see DataCube.trend)
+TREND_POINTS = 1024
+
 # Main Callback
 @app.callback(
+    Output('templates', 'data'),
+    [Input('templates_request', 'data')])
+def update_templates(request):
+    if request is None:
+        raise PreventUpdate
+    return get_templates(data.cube, request['datatype'], request['logscale'])
+
+@lru_cache(maxsize=64)
+def get_templates(cube, datatype, logscale):
+    # figures of a year with values, whose layout serves all the others
+    year = int(cube.first_year(datatype, logscale))
+    z_values, mean_values, zmin, zmax = cube.view(datatype, logscale, year)
+    colorscale = colorscales[indicators[datatype]['colorscale']]
+    times, trend = cube.trend(datatype, logscale, TREND_POINTS)
+    return {'datatype': datatype, 'logscale': logscale, 'version': cube.version_of([datatype]),
+            'general_plot': get_general_plot(trend, colorscale, year, times),
+            'choropleth': get_choropleth(z_values, cube.codes, cube.names, colorscale, zmin, zmax),
+            'histogram': get_histogram(cube.histogram(datatype, logscale, year), colorscale, zmin, zmax)}
+
+@app.callback(
+    [Output('figures', 'data'),
+     Output('templates_request', 'data')],
+    [Input('datatype_dropdown', 'value'),
+     Input('logscale_flag', 'values'),
+     Input('years_slider', 'value')],
+    [State('templates_view', 'data')])
+def update_figures(datatype, logscale_flag, year, templates_view):
+    cube = data.cube
+    view = {'datatype': datatype, 'logscale': logscale_flag == [1], 'version': cube.version_of([datatype])}
+    z_values, mean_values, zmin, zmax = cube.view(datatype, logscale_flag == [1], year)
+    figures = dict(view, year=year, z=z_values, mean=mean_values[cube.year_index[year]],
+                   histogram=cube.histogram(datatype, logscale_flag == [1], year))
+    # new templates and frames only for another view or newer data (e.g.
+    # after a reload, whose new values may not match the old countries)
+    return figures, view if templates_view != view else dash.no_update
+
+@app.callback(
+    Output('frames', 'data'),
+    [Input('templates_request', 'data')])
+def update_frames(request):
+    if request is None:
+        raise PreventUpdate
+    cube = data.cube
+    z_values, mean_values, histograms = cube.series(request['datatype'], request['logscale'])
+    frames = get_frames(z_values, mean_values, cube.years, histograms)
+    frames.update({'datatype': request['datatype'], 'logscale': request['logscale'],
+                   'version': cube.version_of([request['datatype']])})
+    return frames
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'view'),
+    Output('templates_view', 'data'),
+    [Input('templates', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'render'),
     [Output('general_plot', 'figure'),
      Output('choropleth', 'figure'),
      Output('histogram', 'figure')],
-    [Input('datatype_dropdown', 'value'),
-     Input('logscale_flag', 'values'),
-     Input('years_slider', 'value')])
-def update_figures(datatype, logscale_flag, year):
-    zmin = dfs[datatype].loc[codes, :].min().min()
-    zmax = dfs[datatype].loc[codes, :].max().max()
-    z_values = dfs[datatype].loc[codes, year]
-    mean_values = dfs[datatype].loc[codes, :].mean(0)
-    if logscale_flag == [1]:
-        z_values = np.log(z_values)
-        mean_values = np.log(mean_values)
-        zmin = np.log(zmin)
-        zmax = np.log(zmax)
-    colorscale = scl2 if datatype=='life' else scl1
-    return get_general_plot(mean_values, colorscale, year),\
-           get_choropleth(z_values, codes, names, colorscale, zmin, zmax),\
-           get_histogram(z_values, 'doane', colorscale, zmin, zmax)
+    [Input('templates', 'data'),
+     Input('figures', 'data'),
+     Input('frames', 'data'),
+     Input('animation', 'data'),
+     Input('selection', 'data')],
+    [State('interval', 'disabled'),
+     State('general_plot', 'figure'),
+     State('choropleth', 'figure'),
+     State('histogram', 'figure')])
 
 @app.callback(
     [Output('aggregation', 'children'),
-     Output('distribution','children')],
+     Output('distribution','children'),
+     Output('top_countries', 'children')],
     [Input('datatype_dropdown', 'value'),
      Input('logscale_flag', 'values'),
      Input('years_slider', 'value')])
 def update_aggregation(datatype, logscale_flag, year):
     valuename = available_datatypes[datatype].lower()
-    df = dfs[datatype].loc[codes, year]
-    df_c = dfs_continents[datatype].loc[:, year]
-    log_string = ""
-    if logscale_flag == [1]:
-        df = np.log(df)
-        df_c = np.log(df_c)
-        log_string = " (log)"
-    if datatype in ("population"):
-        agg_string = [html.P(children="Total world {}{}: {:,d}".format(valuename, log_string, int(df.sum())))]
-        for row in df_c.sort_values(ascending=False).iteritems():
+    logscale = logscale_flag == [1]
+    cube = data.cube
+    log_string = " (log)" if logscale else ""
+    if cube.count(datatype, logscale, year) == 0:
+        # e.g. the first year of a growth rate
+        return ([html.P(children="No {}{} data for {}".format(valuename, log_string, year))],
+                ['No data on the {} in {}'.format(valuename, year)], [])
+    median, total = cube.world(datatype, logscale, year)
+    if indicators[datatype].get('aggregate', 'median') == 'sum':
+        value_format = "{:,.0f}"
+        agg_string = [html.P(children="Total world {}{}: {:,d}".format(valuename, log_string, int(total)))]
+        for name, value in cube.continent_ranking(datatype, logscale, year, ascending=False):
             agg_string.append(html.P(style={'marginLeft': 20},
-                                     children="- {}:  {:,d}".format(row[0], int(row[1]))))
+                                     children="- {}:  {:,d}".format(name, int(value))))
     else:
-        agg_string = [html.P(children="Median world {}{}: {:.2f}".format(valuename, log_string, df.median()))]
-        for row in df_c.sort_values(ascending=True).iteritems():
+        value_format = "{:.2f}"
+        agg_string = [html.P(children="Median world {}{}: {:.2f}".format(valuename, log_string, median))]
+        for name, value in cube.continent_ranking(datatype, logscale, year, ascending=True):
             agg_string.append(html.P(style={'marginLeft': 20},
-                                     children="- {}:  {:.2f}".format(row[0], row[1])))
-    return agg_string, ['Distribution of the {} accross the world'.format(valuename)]
+                                     children="- {}:  {:.2f}".format(name, value)))
+    top_string = []
+    for label, largest in (("Highest", True), ("Lowest", False)):
+        top_string.append(html.P(children="{} {}{}:".format(label, valuename, log_string)))
+        for name, value in cube.top_countries(datatype, logscale, year, 5, largest):
+            top_string.append(html.P(style={'marginLeft': 20},
+                                     children="- {}:  {}".format(name, value_format.format(value))))
+    return agg_string, ['Distribution of the {} accross the world'.format(valuename)], top_string
+
+@app.callback(
+    [Output('selection', 'data'),
+     Output('selection_summary', 'children')],
+    [Input('histogram', 'selectedData'),
+     Input('datatype_dropdown', 'value'),
+     Input('logscale_flag', 'values'),
+     Input('years_slider', 'value')])
+def update_selection(selected_data, datatype, logscale_flag, year):
+    if not selected_data or 'range' not in selected_data:
+        return None, []
+    low, high = sorted(selected_data['range']['x'])
+    logscale = logscale_flag == [1]
+    cube = data.cube
+    points = cube.select_range(datatype, logscale, year, low, high)
+    selected = [cube.names[i] for i in points[::-1]]
+    valuename = available_datatypes[datatype].lower()
+    summary = [html.P(children="{} countries with {}{} from {:.2f} to {:.2f}:".format(
+        len(selected), valuename, " (log)" if logscale else "", low, high))]
+    if selected:
+        more = " and {} more".format(len(selected) - 10) if len(selected) > 10 else ""
+        summary.append(html.P(style={'marginLeft': 20}, children="; ".join(selected[:10]) + more))
+    return {'datatype': datatype, 'logscale': logscale, 'version': cube.version_of([datatype]),
+            'year': year, 'points': points}, summary
 
 @app.callback(
     Output('description', 'children'),
@@ -192,31 +292,106 @@ def update_aggregation(datatype, logscale_flag, year):
 def update_description(datatype):
     return descriptions[datatype]
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction('animation', 'toggle'),
     [Output('playbutton', 'children'),
-    Output('years_slider', 'value'),
-    Output('playbutton', 'title')],
-    [Input('interval', 'n_intervals'),
-     Input('playbutton', 'n_clicks')],
+     Output('years_slider', 'value'),
+     Output('interval', 'n_intervals'),
+     Output('interval', 'disabled')],
+    [Input('playbutton', 'n_clicks')],
     [State('years_slider', 'value'),
-    State('playbutton', 'title')])
-def update_button(n, value, year, buttontitle):
-    if value is None or value % 2 == 0: #currently pause
-        return 'Play', year, buttontitle
-    else:
-        if buttontitle == "left":
-            if year > 1960:
-                year -= 1
-            else:
-                buttontitle = "right"
-                year += 1
-        else:
-            if year < 2016:
-                year += 1
-            else:
-                buttontitle = "left"
-                year -= 1
-        return 'Pause', year, buttontitle
+     State('animation', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'step'),
+    Output('animation', 'data'),
+    [Input('interval', 'n_intervals')],
+    [State('years_slider', 'value'),
+     State('animation', 'data'),
+     State('frames', 'data')])
+
+server_callbacks = [update_templates, update_figures, update_frames,
+                    update_aggregation, update_selection, update_description]
+serialize_callbacks(app, server_callbacks)
+# Responses of the pure callbacks are shared between workers, keyed by the
+# version of the indicators they depend on; not those of the selection,
+# whose ranges are continuous (a binary search is cheaper than a lookup)
+response_cache = get_response_cache(lambda args: data.cube.version_of(args))
+if response_cache is not None:
+    cache_callbacks(app, response_cache, [callback for callback in server_callbacks
+                                          if callback is not update_selection])
+data.listeners.append(lambda cube, changed: get_templates.cache_clear())
+
+# Optional warm-up of the responses (WARMUP=1), again for the indicators
+# that change on a reload; progress at /_warmup
+warmup = get_warmup(app.callback_map, {
+    ('datatype_dropdown', 'value'): list(available_datatypes.keys()),
+    ('logscale_flag', 'values'): [[], [1]],
+    ('years_slider', 'value'): [int(year) for year in data.cube.years],
+    # as sent by a browser without templates yet
+    ('templates_view', 'data'): [None],
+    ('templates_request', 'data'): lambda: [
+        {'datatype': datatype, 'logscale': logscale, 'version': data.cube.version_of([datatype])}
+        for datatype in available_datatypes for logscale in (False, True)],
+})
+if warmup is not None:
+    data.listeners.append(lambda cube, changed: warmup.start(changed))
+
+# Metrics of the served callbacks (the warm-up calls are not recorded), per
+# process, in the Prometheus text format at /metrics
+metrics = Metrics(datatypes=available_datatypes)
+instrument_callbacks(app, metrics, server_callbacks)
+
+def get_cache_stats():
+    stats = {'templates': tuple(get_templates.cache_info()[:2])}
+    if response_cache is not None:
+        stats['responses'] = (response_cache.hits, response_cache.misses)
+    return stats
+
+metrics.collect('cache_hits_total', 'Hits of the caches.', lambda: [
+    ([('cache', name)], hits) for name, (hits, misses) in get_cache_stats().items()], 'counter')
+metrics.collect('cache_misses_total', 'Misses of the caches.', lambda: [
+    ([('cache', name)], misses) for name, (hits, misses) in get_cache_stats().items()], 'counter')
+metrics.collect('cache_hit_ratio', 'Hit ratio of the caches.', lambda: [
+    ([('cache', name)], hits / (hits + misses) if hits + misses else 0.0)
+    for name, (hits, misses) in get_cache_stats().items()])
+if response_cache is not None:
+    metrics.collect('response_cache_errors_total', 'Errors of the response cache, the responses being computed.',
+                    lambda: [([], response_cache.errors)], 'counter')
+metrics.collect('indicators_resident', 'Indicators loaded in memory.', lambda: [([], len(data.cube.resident()))])
+if warmup is not None:
+    metrics.collect('warmup_tasks', 'Tasks of the warm-up, done and in total.', lambda: [
+        ([('state', state)], warmup.progress()[state]) for state in ('done', 'total')])
+
+@server.route(app.config.routes_pathname_prefix + 'metrics')
+def metrics_text():
+    return flask.Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@server.route(app.config.routes_pathname_prefix + '_warmup')
+def warmup_progress():
+    return flask.jsonify(warmup.progress() if warmup is not None else {'state': 'disabled'})
+
+def preload():
+    """
+    Loads the indicators, and runs the warm-up if enabled, in the process the
+    workers are forked from (see gunicorn.conf.py): they share the loaded
+    data copy-on-write and find the responses cached, in process and in the
+    response cache.
+    """
+    data.cube.preload()
+    if warmup is not None:
+        warmup.run()
+    startup.report()
+
+def start():
+    """
+    Starts the background work of a serving process.
+    """
+    data.start()
+    if warmup is not None and warmup.progress()['state'] == 'idle':
+        warmup.start() # not preloaded
 
 if __name__ == '__main__':
+    preload()
+    start()
     app.run_server(debug=True)
\ No newline at end of file
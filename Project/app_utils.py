@@ -9,6 +9,7 @@ mapbox_access_token = "pk.eyJ1IjoicGxvdGx5bWFwYm94IiwiYSI6ImNqdnBvNDMyaTAxYzkzeW
 main_colors = ['#FF3368', '#554DD2', '#5BEFA7', "orange"]
 scl1 = [[0.0, main_colors[2]], [0.5, main_colors[1]], [1.0, main_colors[0]]]
 scl2 = [[0.0, main_colors[0]], [0.5, main_colors[1]], [1.0, main_colors[2]]]
+colorscales = {'default': scl1, 'reversed': scl2}
 
 def get_choropleth(z_values, codes, names, colorscale, zmin, zmax):
     zoom = 12.0
@@ -56,8 +57,12 @@ def get_choropleth(z_values, codes, names, colorscale, zmin, zmax):
     choropleth = {'data': choropleth_data, 'layout': choropleth_layout}
     return choropleth
 
-def get_histogram(z_values, bins, colorscale, zmin, zmax):
-    yVal, xVal = np.histogram(z_values, bins)
+def get_histogram(histogram, colorscale, zmin, zmax):
+    """
+    histogram is a precomputed {'x': bin edges, 'y': counts} dict
+    (see data_utils.DataCube.histogram).
+    """
+    yVal, xVal = histogram['y'], histogram['x']
     histogram_data = [
                 go.Bar(x=xVal, y=yVal, marker=dict(color=xVal, colorscale=colorscale, cmin=zmin, cmax=zmax), hoverinfo="x"),
                 go.Scatter(
@@ -110,16 +115,33 @@ def get_histogram(z_values, bins, colorscale, zmin, zmax):
     histogram = {'data': histogram_data, 'layout': histogram_layout}
     return histogram
 
-def get_general_plot(z_values, colorscale, year):
-    xs = np.arange(1960,2017,1)
-    ys = z_values.loc[xs]
+def get_frames(z_values, mean_values, years, histograms):
+    """
+    Per-year data used by assets/animation.js to advance the figures in the
+    browser: z_values is a country x year array, mean_values and histograms
+    have one entry per year.
+    """
+    return {'years': years, 'z': z_values.T, 'means': mean_values, 'histograms': histograms}
+
+def get_general_plot(z_values, colorscale, year, years):
+    # years: any increasing time index (numbers or datetimes), e.g. the
+    # downsampled one of DataCube.trend, and year one of its original values
+    xs = np.asarray(years)
+    ys = np.asarray(z_values)
+    # the marker sits on the plotted line, between the points kept around year
+    if np.issubdtype(xs.dtype, np.datetime64):
+        marker = np.interp(np.datetime64(year, 'ns').astype(np.int64),
+                           xs.astype('datetime64[ns]').astype(np.int64), ys)
+    else:
+        marker = np.interp(year, xs, ys)
     plot_data = [dict(
             type='scatter',
             mode='lines',
             x=xs, y=ys,
             colorscale=colorscale,
             line=dict(
-                shape="spline",
+                # splines of long series are costly to draw, and not smoother
+                shape="spline" if len(xs) <= 100 else "linear",
                 smoothing=2,
                 width=1,
                 # colorscale=colorscale
@@ -128,7 +150,7 @@ def get_general_plot(z_values, colorscale, year):
             type='scatter',
             mode='markers',
             x=[year],
-            y=[z_values.loc[year]],
+            y=[marker],
             line=dict(
                 shape="spline",
                 smoothing=2,
@@ -152,14 +174,14 @@ def get_general_plot(z_values, colorscale, year):
         showlegend=False,
         plot_bgcolor="#1E1E1E", paper_bgcolor="#1E1E1E", zoom=1,
         xaxis=dict(
-            range=[1960, 2016],
+            range=[xs[0], xs[-1]],
             showticklabels=False,
             showgrid=False,
             showline=False,
             fixedrange=True,
         ),
         yaxis=dict(
-            range=[min(ys)*0.9, max(ys)*1.1],
+            range=[np.nanmin(ys)*0.9, np.nanmax(ys)*1.1],
             showticklabels=True,
             showgrid=True,
             fixedrange=True,
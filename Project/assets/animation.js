@@ -0,0 +1,153 @@
+// The server sends the static figures once per indicator (the `templates`
+// store) and afterwards only the values of the selected year (`figures`).
+// In Play mode the values for every year are sent once (`frames`) and
+// advanced here, without a server round-trip per frame.
+// Every store carries the version of the data it comes from, so that the
+// values of a reloaded indicator are never drawn on the older templates.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    animation: {
+        toggle: function(n_clicks, year, animation) {
+            if (n_clicks === undefined || n_clicks === null || n_clicks % 2 === 0) {
+                // pause: leave the slider at the last displayed year
+                if (animation) {
+                    year = animation.year;
+                }
+                return ['Play', year, 0, true];
+            }
+            return ['Pause', year, 0, false];
+        },
+
+        step: function(n_intervals, year, animation, frames) {
+            if (!n_intervals || !animation || !frames) {
+                return {year: year, direction: animation ? animation.direction : 'right'};
+            }
+            // back and forth over the years of the data
+            var years = frames.years;
+            var i = years.indexOf(animation.year);
+            var direction = animation.direction;
+            if (direction === 'left') {
+                if (i > 0) {
+                    i -= 1;
+                } else {
+                    direction = 'right';
+                    i += 1;
+                }
+            } else {
+                if (i < years.length - 1) {
+                    i += 1;
+                } else {
+                    direction = 'left';
+                    i -= 1;
+                }
+            }
+            i = Math.max(0, Math.min(i, years.length - 1));
+            return {year: years[i], direction: direction};
+        },
+
+        view: function(templates) {
+            return templates ? {
+                datatype: templates.datatype,
+                logscale: templates.logscale,
+                version: templates.version,
+            } : null;
+        },
+
+        render: function(templates, figures, frames, animation, selection, disabled,
+                         general_plot, choropleth, histogram) {
+            var values = figures;
+            if (!disabled && frames && animation && sameView(frames, templates)) {
+                var i = frames.years.indexOf(animation.year);
+                if (i >= 0) {
+                    values = {
+                        year: animation.year,
+                        z: frames.z[i],
+                        mean: frames.means[i],
+                        histogram: frames.histograms[i],
+                    };
+                }
+            } else if (!values || !sameView(values, templates)) {
+                // the other store is still on its way from the server
+                return [general_plot, choropleth, histogram];
+            }
+            // highlight the countries of the range selected on the histogram
+            var points = sameView(selection, templates) && selection.year === values.year ?
+                selection.points : null;
+            return [
+                updateGeneralPlot(templates.general_plot, values.year, values.mean),
+                updateChoropleth(templates.choropleth, values.z, points),
+                updateHistogram(templates.histogram, values.histogram.x, values.histogram.y),
+            ];
+        },
+    },
+});
+
+function sameView(a, b) {
+    return Boolean(a && b && a.datatype === b.datatype && a.logscale === b.logscale &&
+                   a.version === b.version);
+}
+
+function updateTrace(trace, props) {
+    return Object.assign({}, trace, props);
+}
+
+function updateGeneralPlot(figure, year, mean) {
+    return {
+        data: [figure.data[0], updateTrace(figure.data[1], {x: [year], y: [mean]})],
+        layout: figure.layout,
+    };
+}
+
+// width of the map (device pixels) from which the detailed 50m geometry
+// is used instead of the 110m one
+var DETAILED_MAP_WIDTH = 1600;
+
+function geoResolution() {
+    // the map takes eight of the twelve grid columns
+    var width = window.innerWidth * 8 / 12 * (window.devicePixelRatio || 1);
+    return width >= DETAILED_MAP_WIDTH ? 50 : 110;
+}
+
+function updateChoropleth(figure, z, points) {
+    var props = {z: z};
+    if (points) {
+        props.selectedpoints = points;
+        props.unselected = {marker: {opacity: 0.2}};
+    }
+    return {
+        data: [updateTrace(figure.data[0], props)],
+        layout: Object.assign({}, figure.layout, {
+            geo: Object.assign({}, figure.layout.geo, {resolution: geoResolution()}),
+        }),
+    };
+}
+
+function updateHistogram(figure, x, y) {
+    // mirrors app_utils.get_histogram
+    if (!y.length) {
+        // a year without values
+        return {
+            data: [updateTrace(figure.data[0], {x: [], y: []}), updateTrace(figure.data[1], {x: [], y: []})],
+            layout: Object.assign({}, figure.layout, {annotations: []}),
+        };
+    }
+    var ymax = Math.max.apply(null, y);
+    var annotation = figure.layout.annotations[0];
+    var layout = Object.assign({}, figure.layout, {
+        xaxis: Object.assign({}, figure.layout.xaxis, {range: [x[0], x[x.length - 1]]}),
+        yaxis: Object.assign({}, figure.layout.yaxis, {range: [0, ymax + ymax / 4]}),
+        annotations: y.map(function(yi, i) {
+            return Object.assign({}, annotation, {x: x[i], y: yi, text: String(yi)});
+        }),
+    });
+    return {
+        data: [
+            updateTrace(figure.data[0], {
+                x: x,
+                y: y,
+                marker: Object.assign({}, figure.data[0].marker, {color: x}),
+            }),
+            updateTrace(figure.data[1], {x: x, y: y.map(function(yi) { return yi / 2; })}),
+        ],
+        layout: layout,
+    };
+}
@@ -0,0 +1,135 @@
+"""
+Callback latency and payload benchmark, run outside a browser:
+
+    python benchmark.py [--repeat N] [--output results.json] [--compare previous.json]
+
+Every server-side callback registered in app.callback_map is called over the
+whole (datatype, logscale, year) grid, both directly and through the
+/_dash-update-component endpoint with the Flask test client. Reports
+p50/p95/p99 latency, response size and memory use, and saves the results so
+that later runs can be compared against them. The Play controls run in the
+browser (assets/animation.js) and have no server-side cost to measure.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import platform
+import itertools
+import tracemalloc
+import numpy as np
+
+def get_grid(app, inputs):
+    cube = app.data.cube
+    values = {
+        ('datatype_dropdown', 'value'): list(app.available_datatypes.keys()),
+        ('logscale_flag', 'values'): [[], [1]],
+        ('years_slider', 'value'): [int(year) for year in cube.years],
+        ('histogram', 'selectedData'): [None, {'range': {'x': [1.0, 3.0]}}],
+        ('templates_view', 'data'): [None],
+        ('templates_request', 'data'): [{'datatype': datatype, 'logscale': logscale,
+                                         'version': cube.version_of([datatype])}
+                                        for datatype in app.available_datatypes for logscale in (False, True)],
+    }
+    return list(itertools.product(*[values[(c['id'], c['property'])] for c in inputs]))
+
+def get_stats(latencies, sizes, peak_alloc):
+    latencies = np.array(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_bytes': float(np.mean(sizes)),
+        'max_bytes': int(np.max(sizes)),
+        'peak_alloc_kb': peak_alloc / 1024,
+    }
+
+def measure(call, grid, repeat):
+    # memory is traced separately, tracemalloc would distort the timings
+    tracemalloc.start()
+    call(grid[0])
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies, sizes = [], []
+    for _ in range(repeat):
+        for args in grid:
+            start = time.perf_counter()
+            response = call(args)
+            latencies.append(time.perf_counter() - start)
+            # bytes, as sent: the callbacks return str, the endpoint bytes
+            sizes.append(len(response.encode('utf-8') if isinstance(response, str) else response))
+    return get_stats(latencies, sizes, peak_alloc)
+
+def run(app, repeat):
+    client = app.server.test_client()
+    results = {}
+    for output, registration in app.app.callback_map.items():
+        if 'callback' not in registration: # clientside
+            continue
+        callback = registration['callback']
+        inputs, state = registration['inputs'], registration.get('state', [])
+        grid = get_grid(app, inputs + state)
+
+        def request(args):
+            body = {'output': output,
+                    'inputs': [dict(c, value=value) for c, value in zip(inputs, args)],
+                    'state': [dict(c, value=value) for c, value in zip(state, args[len(inputs):])]}
+            return client.post('/_dash-update-component', json=body).get_data()
+
+        name = callback.__name__
+        results[name] = {
+            'callback': measure(lambda args: callback(*args), grid, repeat),
+            'http': measure(request, grid, repeat),
+        }
+        print_row(name, results[name])
+    return results
+
+def print_row(name, result, previous=None):
+    for mode in ('callback', 'http'):
+        stats = result[mode]
+        line = '{:<20} {:<8} p50 {:8.2f} ms  p95 {:8.2f} ms  p99 {:8.2f} ms  {:10.0f} B  {:8.0f} kB'.format(
+            name, mode, stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            stats['mean_bytes'], stats['peak_alloc_kb'])
+        if previous is not None and name in previous:
+            old = previous[name][mode]
+            line += '  p50 x{:.2f}  p99 x{:.2f}  size x{:.2f}'.format(
+                stats['p50_ms'] / old['p50_ms'], stats['p99_ms'] / old['p99_ms'],
+                stats['mean_bytes'] / old['mean_bytes'])
+        print(line)
+
+def get_versions():
+    versions = {'python': platform.python_version()}
+    for module in ('dash', 'plotly', 'numpy', 'pandas'):
+        versions[module] = sys.modules[module].__version__
+    return versions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the grid')
+    parser.add_argument('--output', default='benchmark.json', help='where to save the results')
+    parser.add_argument('--compare', help='results of a previous run to compare against')
+    parser.add_argument('--cache', action='store_true', help='keep the shared response cache enabled')
+    args = parser.parse_args()
+    if not args.cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+
+    import app
+    results = run(app, args.repeat)
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versions': get_versions(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print('\nCompared to {} ({})'.format(args.compare, previous['timestamp']))
+        for name, result in results.items():
+            print_row(name, result, previous['results'])
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('\nmax RSS {} kB, saved to {}'.format(report['max_rss_kb'], args.output))
@@ -0,0 +1,133 @@
+import os
+import sys
+import glob
+import json
+import time
+import inspect
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from functools import wraps
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized callback responses, kept in a SQLite file
+    so that all worker processes on a host share it.
+    Keys include `version` (the data version, or a function of the callback
+    arguments returning it), so bumping it invalidates the entries it covers,
+    and `code_version`, so that the file outlives no deploy of new code.
+    The last use of an entry is refreshed at most every `touch_interval`
+    seconds, so that reads seldom take the write lock shared by the workers.
+    """
+    def __init__(self, path, max_entries=4096, version='', code_version='', touch_interval=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self.code_version = code_version
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS responses '
+                       '(key TEXT PRIMARY KEY, value TEXT, used REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+
+    def _connect(self):
+        # connections are neither fork- nor thread-safe: one per process and thread
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.db = sqlite3.connect(self.path, timeout=10)
+            self._local.db.execute('PRAGMA journal_mode=WAL')
+            self._local.db.execute('PRAGMA synchronous=NORMAL')
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def key(self, name, args):
+        version = self.version(args) if callable(self.version) else self.version
+        payload = json.dumps([self.code_version, version, name, args], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute('SELECT value, used FROM responses WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            if row is not None and now - row[1] > self.touch_interval:
+                db.execute('UPDATE responses SET used = ? WHERE key = ?', (now, key))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (key, value, time.time()))
+            db.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+                       'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute('DELETE FROM responses')
+
+    def memoize(self, name, func):
+        """
+        Wraps a Dash callback (as registered in app.callback_map, i.e. returning
+        the serialized response) so that its responses are served from cache.
+        Errors of the cache (e.g. a lock held too long, a full disk or a
+        corrupt file) are counted and the response computed instead.
+        """
+        @wraps(func)
+        def cached(*args):
+            key = self.key(name, args)
+            try:
+                response = self.get(key)
+            except sqlite3.Error:
+                self.errors += 1
+                return func(*args)
+            if response is None:
+                response = func(*args)
+                try:
+                    self.set(key, response)
+                except sqlite3.Error:
+                    self.errors += 1
+            return response
+        return cached
+
+def get_code_version(path=os.path.dirname(os.path.abspath(__file__))):
+    """
+    Hash of the Python sources of the app (the modules in `path`).
+    """
+    version = hashlib.md5()
+    for filename in sorted(glob.glob(os.path.join(path, '*.py'))):
+        with open(filename, 'rb') as f:
+            version.update(f.read())
+    return version.hexdigest()
+
+def get_response_cache(version=''):
+    """
+    ResponseCache configured from the environment:
+    RESPONSE_CACHE_PATH (default: <tmp>/dataviz-responses.sqlite) and
+    RESPONSE_CACHE_SIZE (default: 4096 entries, 0 disables the cache).
+    Entries of other versions of the code are never served. None if disabled
+    or if the file cannot be opened.
+    """
+    max_entries = int(os.environ.get('RESPONSE_CACHE_SIZE', 4096))
+    if max_entries <= 0:
+        return None
+    path = os.environ.get('RESPONSE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'dataviz-responses.sqlite'))
+    try:
+        return ResponseCache(path, max_entries, version, get_code_version())
+    except sqlite3.Error as e:
+        print('Response cache disabled, {} cannot be used: {!r}'.format(path, e), file=sys.stderr)
+        return None
+
+def cache_callbacks(app, cache, callbacks):
+    """
+    Serves the responses of the given (pure) Dash callbacks from cache.
+    """
+    functions = [inspect.unwrap(callback) for callback in callbacks]
+    for output, registration in app.callback_map.items():
+        if 'callback' in registration and inspect.unwrap(registration['callback']) in functions:
+            registration['callback'] = cache.memoize(output, registration['callback'])
@@ -1,6 +1,19 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
 from os.path import join as pjoin
+import numpy as np
 import pandas as pd
-import pycountry
+
+from profile_utils import startup
+from indicators import indicators, universe
+from countries import countries as country_names
 
 continents = [
     'North America',
@@ -13,58 +26,631 @@ continents = [
     'South Asia',
     'Australia',
 ]
+# Binary snapshot of the cleaned data (see write_snapshot / read_indicator).
+# Bump SNAPSHOT_VERSION whenever the cleaning in get_df changes.
+SNAPSHOT_VERSION = 3
+snapshot_dir = pjoin('data', 'snapshot')
+
+def get_source(key, registry=indicators):
+    """
+    Path of the CSV of an indicator: the latest file matching its pattern.
+    """
+    indicator = registry[key]
+    paths = sorted(glob.glob(pjoin('data', indicator['directory'], indicator['pattern'])))
+    if not paths:
+        raise IOError("No data for indicator '{}' in {}".format(key, pjoin('data', indicator['directory'])))
+    return paths[-1]
+
+def is_derived(key, registry=indicators):
+    return 'expression' in registry[key]
 
-def get_df(subdir, fname, continent=False):
-    df = pd.read_csv(pjoin('data', subdir, fname), header=2).iloc[:,:-3].dropna()
+def get_sources(registry=indicators):
+    """
+    Returns {key: signature} of the sources of the base indicators; file stats
+    keep it cheap to compute for any number of indicators.
+    """
+    sources = {}
+    for key in registry:
+        if is_derived(key, registry):
+            continue
+        source = get_source(key, registry)
+        stat = os.stat(source)
+        sources[key] = '{}:{}:{}'.format(source, stat.st_size, stat.st_mtime)
+    return sources
+
+def get_df(path, continent=False):
+    df = pd.read_csv(path, header=2).iloc[:,:-3].dropna()
     if continent:
         df_continent = df.set_index(df['Country Name']).loc[:,'1960':]
-        df_continent = df_continent.loc[map(lambda x: x in continents, df_continent.index)]
+        df_continent = df_continent.loc[df_continent.index.isin(continents)]
         df_continent.columns = df_continent.columns.astype(int)
     df = df.set_index(df['Country Code']).loc[:,'1960':]
-    df = df.loc[map(lambda x: pycountry.countries.get(alpha_3=x) is not None, df.index)]
+    df = df.loc[df.index.isin(list(country_names))]
     df.columns = df.columns.astype(int)
-    print(df.shape)
     if continent:
         return df, df_continent
     return df
 
 def get_all_countries(dfs):
-    all_countries = sorted(list(set.intersection(*[set(dfs[key].index) for key in dfs])))
-    print(len(all_countries), "countries")
-    return all_countries
-
-def unify_dfs(dfs, countries):
-    for key in dfs:
-        dfs[key] = dfs[key].loc[countries]
-    return dfs
-
-def get_data():
-    df_f, df_f_c = get_df('fertility-rate', 'API_SP.DYN.TFRT.IN_DS2_en_csv_v2_10474146.csv', True)
-    df_le, df_le_c = get_df('life-expectancy-at-birth', 'API_SP.DYN.LE00.IN_DS2_en_csv_v2_10473758.csv', True)
-    df_pop, df_pop_c = get_df('population', 'API_SP.POP.TOTL_DS2_en_csv_v2_10473719.csv', True)
-    df_br, df_br_c = get_df('birth-rate-crude', 'API_SP.DYN.CBRT.IN_DS2_en_csv_v2_10475710.csv', True)
-    df_dr, df_dr_c = get_df('death-rate-crude', 'API_SP.DYN.CDRT.IN_DS2_en_csv_v2_10474583.csv', True)
-    dfs = {
-        'fertility': df_f,
-        'life': df_le,
-        'population': df_pop,
-        'birth': df_br,
-        'death': df_dr
-    }
-    dfs_continents = {
-        'fertility': df_f_c,
-        'life': df_le_c,
-        'population': df_pop_c,
-        'birth': df_br_c,
-        'death': df_dr_c
-    }
+    return sorted(list(set.intersection(*[set(dfs[key].index) for key in dfs])))
+
+def get_names(codes):
+    return [country_names[iso3code] for iso3code in codes]
+
+def write_countries(path='countries.py'):
+    """
+    Regenerates the static ISO-3 -> name table (countries.py) from pycountry,
+    which is then not needed at runtime.
+    """
+    import pycountry
+    import pkg_resources
+    version = pkg_resources.get_distribution('pycountry').version
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# ISO 3166-1 alpha-3 code -> country name, generated from pycountry {}\n"
+                "# by `python data_utils.py countries`, do not edit by hand.\n"
+                "from types import MappingProxyType\n\n"
+                "countries = MappingProxyType({{\n".format(version))
+        for country in sorted(pycountry.countries, key=lambda country: country.alpha_3):
+            f.write("    {!r}: {!r},\n".format(country.alpha_3, country.name))
+        f.write("})\n")
+
+def get_signature(path):
+    """
+    Content hash of a source CSV, used to detect a stale snapshot.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def get_all_years(dfs):
+    return sorted(int(year) for year in set.intersection(*[set(dfs[key].columns) for key in dfs]))
+
+def get_universe_from_csv(registry=indicators):
+    dfs = {key: get_df(get_source(key, registry)) for key in universe}
     codes = get_all_countries(dfs)
-    dfs = unify_dfs(dfs, codes)
-    names = []
-    for iso3code in codes:
-        country = pycountry.countries.get(alpha_3=iso3code)
-        names.append(country.name)
-    return dfs, dfs_continents, codes, names
+    return codes, get_names(codes), get_all_years(dfs)
+
+def get_indicator_from_csv(key, codes, years, registry=indicators):
+    df, df_continent = get_df(get_source(key, registry), True)
+    return df.reindex(index=codes, columns=years), df_continent.reindex(columns=years)
+
+def write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+def write_npy(path, array):
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+def write_snapshot(path=snapshot_dir, registry=indicators):
+    """
+    Build step: writes the country universe (universe.json) and, per indicator,
+    <key>.values.npy (country x year), <key>.continents.npy (continent x year,
+    NaN where missing) and <key>.json with the metadata.
+    """
+    os.makedirs(path, exist_ok=True)
+    codes, names, years = get_universe_from_csv(registry)
+    write_json(pjoin(path, 'universe.json'), {
+        'version': SNAPSHOT_VERSION,
+        'sources': {key: get_signature(get_source(key, registry)) for key in universe},
+        'codes': codes,
+        'names': names,
+        'years': years,
+    })
+    for key in registry:
+        if is_derived(key, registry):
+            continue
+        source = get_source(key, registry)
+        df, df_continent = get_indicator_from_csv(key, codes, years, registry)
+        write_npy(pjoin(path, key + '.values.npy'), df.values.astype(np.float64))
+        write_npy(pjoin(path, key + '.continents.npy'), df_continent.reindex(continents).values.astype(np.float64))
+        # the metadata goes last: a snapshot without up-to-date metadata is treated as stale
+        write_json(pjoin(path, key + '.json'), {
+            'version': SNAPSHOT_VERSION,
+            'source': [os.path.basename(source), get_signature(source)],
+            'codes': hashlib.md5(json.dumps(codes).encode('utf-8')).hexdigest(),
+            'years': years,
+            'continents': list(df_continent.index),
+        })
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def read_universe(path=snapshot_dir, registry=indicators):
+    """
+    Returns (codes, names, years) from the snapshot, None if it is missing or
+    stale.
+    """
+    meta = read_json(pjoin(path, 'universe.json'))
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION or \
+            meta.get('sources') != {key: get_signature(get_source(key, registry)) for key in universe}:
+        return None
+    return meta['codes'], meta['names'], meta['years']
+
+def read_indicator(key, codes, years, path=snapshot_dir, registry=indicators):
+    """
+    Memory-maps an indicator of the snapshot, returns (df, df_continent) or
+    None if it is missing or older than its CSV.
+    """
+    meta = read_json(pjoin(path, key + '.json'))
+    source = get_source(key, registry)
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION or \
+            meta.get('source') != [os.path.basename(source), get_signature(source)] or \
+            meta.get('codes') != hashlib.md5(json.dumps(list(codes)).encode('utf-8')).hexdigest() or \
+            meta.get('years') != list(years):
+        return None
+    values = np.load(pjoin(path, key + '.values.npy'), mmap_mode='r')
+    continents_values = np.load(pjoin(path, key + '.continents.npy'), mmap_mode='r')
+    df = pd.DataFrame(values, index=pd.Index(codes, name='Country Code'), columns=years, copy=False)
+    df_continent = pd.DataFrame(continents_values, index=pd.Index(continents, name='Country Name'),
+                                columns=years, copy=False)
+    return df, df_continent.loc[meta['continents']]
+
+def get_universe(registry=indicators):
+    with startup.phase('universe: read snapshot'):
+        universe_data = read_universe(registry=registry)
+    if universe_data is None:
+        with startup.phase('universe: parse CSVs'):
+            universe_data = get_universe_from_csv(registry)
+    return universe_data
+
+def get_indicator(key, codes, years, registry=indicators):
+    with startup.phase('{}: read snapshot'.format(key)):
+        data = read_indicator(key, codes, years, registry=registry)
+    if data is None:
+        with startup.phase('{}: parse CSV'.format(key)):
+            data = get_indicator_from_csv(key, codes, years, registry)
+    return data
+
+def get_histograms(samples):
+    """
+    np.histogram(sample, 'doane') for every row of a 2D array in one pass.
+    Returns a list of (counts, bin_edges) pairs.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    finite = np.isfinite(samples).all(1)
+    if not finite.all():
+        # rows with gaps: np.histogram over their finite values
+        histograms = [None] * len(samples)
+        if finite.any():
+            for i, histogram in zip(np.flatnonzero(finite), get_histograms(samples[finite])):
+                histograms[i] = histogram
+        for i in np.flatnonzero(~finite):
+            histograms[i] = np.histogram(samples[i][np.isfinite(samples[i])], 'doane')
+        return histograms
+    n_rows, n = samples.shape
+    rows = np.arange(n_rows)
+    first, last = samples.min(1), samples.max(1)
+    # Doane's bin width, as in np.histogram_bin_edges
+    width = np.zeros(n_rows)
+    sigma = samples.std(1)
+    varying = sigma > 0.0
+    if n > 2 and varying.any():
+        sg1 = np.sqrt(6.0 * (n - 2) / ((n + 1.0) * (n + 3)))
+        x = samples[varying]
+        g1 = (((x - x.mean(1)[:, None]) / sigma[varying][:, None]) ** 3).mean(1)
+        width[varying] = (last - first)[varying] / (1.0 + np.log2(n) + np.log2(1.0 + np.absolute(g1) / sg1))
+    constant = first == last
+    first, last = np.where(constant, first - 0.5, first), np.where(constant, last + 0.5, last)
+    n_bins = np.ones(n_rows, dtype=np.intp)
+    n_bins[width > 0] = np.ceil((last - first)[width > 0] / width[width > 0]).astype(np.intp)
+    # bin edges of all rows, concatenated (np.linspace(first, last, n_bins + 1))
+    edges_offsets = np.concatenate([[0], np.cumsum(n_bins + 1)])
+    edges_rows = np.repeat(rows, n_bins + 1)
+    edges = (np.arange(edges_offsets[-1]) - edges_offsets[edges_rows]) * ((last - first) / n_bins)[edges_rows] \
+            + first[edges_rows]
+    edges[edges_offsets[1:] - 1] = last
+    # bin indices, with the same corrections for rounding as np.histogram
+    indices = ((samples - first[:, None]) * (n_bins / (last - first))[:, None]).astype(np.intp)
+    indices[indices == n_bins[:, None]] -= 1
+    offsets = edges_offsets[:-1, None]
+    indices[samples < edges[offsets + indices]] -= 1
+    indices[(samples >= edges[offsets + indices + 1]) & (indices != n_bins[:, None] - 1)] += 1
+    bins_offsets = np.concatenate([[0], np.cumsum(n_bins)])
+    counts = np.bincount((bins_offsets[:-1, None] + indices).ravel(), minlength=bins_offsets[-1])
+    return list(zip(np.split(counts, bins_offsets[1:-1]), np.split(edges, edges_offsets[1:-1])))
+
+def lttb(x, y, n_out):
+    """
+    Indices of the n_out points of a series kept by Largest-Triangle-Three-
+    Buckets downsampling (Steinarsson, 2013), which preserves its shape.
+    x must be increasing (numbers or datetimes), y without NaNs.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # the points between the first and the last in n_out - 2 buckets, and
+    # the average point of each (the last point for the last bucket)
+    # (bounds as in the reference implementation, floor(i * every) + 1)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.intp) + 1
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1])[1:] / sizes[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1])[1:] / sizes[1:], y[-1])
+    indices = np.empty(n_out, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    for i in range(n_out - 2):
+        # the point of the bucket making the largest triangle with the
+        # previous selected point and the average of the next bucket
+        a = indices[i]
+        bucket = slice(edges[i], edges[i + 1])
+        areas = np.absolute((x[a] - next_x[i]) * (y[bucket] - y[a]) - (x[a] - x[bucket]) * (next_y[i] - y[a]))
+        indices[i + 1] = edges[i] + np.argmax(areas)
+    return indices
+
+def ranked(order, n_valid, ascending=True):
+    """
+    Reverses an ascending, NaN-last order without moving the NaNs.
+    """
+    if ascending:
+        return order
+    return np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+
+class Indicator:
+    """
+    One loaded indicator: its frames and the statistics every view needs
+    (zmin/zmax, per-year means and histograms, in linear and log scale),
+    plus a rank index of countries and continents per year.
+    """
+    def __init__(self, df, df_continent):
+        self.df = df
+        self.df_continent = df_continent
+        values = np.asarray(df.values, dtype=np.float64) # country x year
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # all-NaN years, e.g. of growth rates
+            # values <= 0 (e.g. negative growth) have no log: missing in log scale
+            self.values = {False: values, True: np.log(np.where(values > 0, values, np.nan))}
+            self.means = {False: np.nanmean(values, 0),
+                          True: np.log(np.nanmean(np.where(values > 0, values, np.nan), 0))}
+            self.zmin = {logscale: np.nanmin(values) for logscale, values in self.values.items()}
+            self.zmax = {logscale: np.nanmax(values) for logscale, values in self.values.items()}
+        # {'x': bin edges, 'y': counts} per year, see get_histograms, empty
+        # for the years without values (e.g. the first one of a growth rate)
+        self.histograms = {logscale: [{'x': xVal, 'y': yVal} if valid else {'x': [], 'y': []}
+                                      for (yVal, xVal), valid in zip(get_histograms(values.T),
+                                                                     np.isfinite(values).any(0))]
+                           for logscale, values in self.values.items()}
+        continent_values = np.asarray(df_continent.values, dtype=np.float64) # continent x year
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # all-NaN years
+            self.continent_values = {False: continent_values,
+                                     True: np.log(np.where(continent_values > 0, continent_values, np.nan))}
+        # rank index per scale, year x position (ascending, NaN last): values
+        # <= 0 are missing in log scale only
+        self.country_order, self.countries_valid, self.sorted_values = {}, {}, {}
+        self.continent_order, self.continents_valid = {}, {}
+        for logscale, values in self.values.items():
+            self.country_order[logscale] = np.argsort(values, 0, kind='mergesort').T
+            self.countries_valid[logscale] = (~np.isnan(values)).sum(0)
+            self.sorted_values[logscale] = np.take_along_axis(values, self.country_order[logscale].T, 0).T
+            continent_values = self.continent_values[logscale]
+            self.continent_order[logscale] = np.argsort(continent_values, 0, kind='mergesort').T
+            self.continents_valid[logscale] = (~np.isnan(continent_values)).sum(0)
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # all-NaN years
+            self.medians = {logscale: np.nanmedian(values, 0) for logscale, values in self.values.items()}
+            self.sums = {logscale: np.nansum(values, 0) for logscale, values in self.values.items()}
+        # (logscale, level): downsampled (times, means), see trend
+        self.trends = {}
+
+    def trend(self, logscale, max_points):
+        """
+        Returns the (times, means) of the trend plot, with at most max_points
+        points. Series that are longer are downsampled (LTTB) to the largest
+        power of two within the budget; the levels of this pyramid are
+        computed once.
+        """
+        times = np.asarray(self.df.columns)
+        means = self.means[logscale]
+        if len(times) <= max_points:
+            return times, means
+        level = 2 ** int(np.log2(max_points))
+        if (logscale, level) not in self.trends:
+            valid = np.flatnonzero(np.isfinite(means))
+            indices = valid[lttb(times[valid], means[valid], level)]
+            self.trends[(logscale, level)] = (times[indices], means[indices])
+        return self.trends[(logscale, level)]
+
+class DataCube:
+    """
+    Country x year data of the indicators in the registry, over a shared
+    country universe. Indicators are loaded on first use and at most
+    max_resident of them are kept in memory (least recently used go first),
+    so startup time and memory do not grow with the registry.
+    A cube built from a previous one reuses its country universe and the
+    indicators whose sources did not change.
+    """
+    def __init__(self, registry=indicators, max_resident=16, previous=None):
+        self.registry = registry
+        self.max_resident = max_resident
+        self.datatypes = list(registry.keys())
+        self.sources = get_sources(registry)
+        if previous is not None and all(self.sources[key] == previous.sources.get(key) for key in universe):
+            self.codes, self.names, years = previous.codes, previous.names, previous.years.tolist()
+        else:
+            self.codes, self.names, years = get_universe(registry)
+        self.years = np.array(years)
+        self.year_index = {year: j for j, year in enumerate(self.years)}
+        self._indicators = OrderedDict()
+        self._lock = threading.RLock() # derived indicators get their inputs under it
+        # identify the data, e.g. for keys of derived caches: one version per
+        # indicator, so that caches of the unchanged ones survive a reload
+        universe_version = json.dumps([self.codes, years])
+        self.versions = {}
+        for key in self.datatypes:
+            self._get_version(key, universe_version)
+        self.version = hashlib.md5(json.dumps(self.versions, sort_keys=True).encode('utf-8')).hexdigest()
+        if previous is not None:
+            for key, indicator in previous.resident().items():
+                if previous.versions[key] == self.versions.get(key):
+                    self._indicators[key] = indicator
+
+    def _get_version(self, key, universe_version):
+        if key not in self.versions:
+            if is_derived(key, self.registry):
+                inputs = [self._get_version(name, universe_version) for name in self.registry[key]['inputs']]
+                version = json.dumps([key] + inputs)
+            else:
+                version = universe_version + self.sources[key]
+            self.versions[key] = hashlib.md5(version.encode('utf-8')).hexdigest()
+        return self.versions[key]
+
+    def preload(self):
+        """
+        Loads the indicators of the universe, then the others of the registry,
+        as many as stay resident.
+        """
+        for key in sorted(self.datatypes, key=lambda key: key not in universe)[:self.max_resident]:
+            self.get(key)
+
+    def resident(self):
+        """
+        Returns {datatype: Indicator} of the loaded indicators.
+        """
+        with self._lock:
+            return OrderedDict(self._indicators)
+
+    def changed(self, sources):
+        """
+        Returns the datatypes whose sources differ from those of the cube,
+        derived ones included.
+        """
+        changed = set(key for key in self.sources if sources.get(key) != self.sources[key])
+        while True:
+            dependent = set(key for key in self.datatypes if is_derived(key, self.registry)
+                            and changed.intersection(self.registry[key]['inputs'])) - changed
+            if not dependent:
+                return [key for key in self.datatypes if key in changed]
+            changed |= dependent
+
+    def version_of(self, args):
+        """
+        Version of the data behind a callback with these arguments: that of
+        the indicators among them (or among the values of a dict argument), of
+        the whole cube if there are none.
+        """
+        values = [value for arg in args for value in (arg.values() if isinstance(arg, dict) else [arg])]
+        versions = [self.versions[value] for value in values if isinstance(value, str) and value in self.versions]
+        return '-'.join(versions) or self.version
+
+    def get(self, datatype):
+        """
+        Returns the Indicator of a datatype, loading it if needed.
+        """
+        with self._lock:
+            if datatype in self._indicators:
+                self._indicators.move_to_end(datatype)
+                return self._indicators[datatype]
+            if datatype not in self.registry:
+                raise KeyError("Unknown indicator '{}'".format(datatype))
+            if is_derived(datatype, self.registry):
+                data = self._derive(datatype)
+            else:
+                data = get_indicator(datatype, self.codes, self.years.tolist(), self.registry)
+            with startup.phase('{}: statistics'.format(datatype)):
+                indicator = Indicator(*data)
+            self._indicators[datatype] = indicator
+            while len(self._indicators) > self.max_resident:
+                self._indicators.popitem(last=False)
+            return indicator
+
+    def _derive(self, datatype):
+        """
+        Evaluates the expression of a derived indicator, once over the country
+        frames of its inputs and once over their continent frames.
+        """
+        indicator = self.registry[datatype]
+        inputs = [self.get(key) for key in indicator['inputs']]
+        with startup.phase('{}: derive'.format(datatype)), np.errstate(divide='ignore', invalid='ignore'):
+            df = indicator['expression'](*[data.df for data in inputs])
+            df_continent = indicator['expression'](*[data.df_continent for data in inputs])
+        df = df.reindex(index=self.codes, columns=self.years).replace([np.inf, -np.inf], np.nan)
+        df_continent = df_continent.reindex(columns=self.years).replace([np.inf, -np.inf], np.nan)
+        # continents are aligned on those of all inputs
+        return df, df_continent.loc[[name for name in continents if name in df_continent.index]]
+
+    def view(self, datatype, logscale, year):
+        """
+        Returns (z_values, mean_values, zmin, zmax) for one indicator and year.
+        """
+        indicator = self.get(datatype)
+        j = self.year_index[year]
+        return (indicator.values[logscale][:, j], indicator.means[logscale],
+                indicator.zmin[logscale], indicator.zmax[logscale])
+
+    def histogram(self, datatype, logscale, year):
+        """
+        Returns the precomputed 'doane' histogram of one indicator and year.
+        """
+        return self.get(datatype).histograms[logscale][self.year_index[year]]
+
+    def series(self, datatype, logscale):
+        """
+        Returns (z_values, mean_values, histograms) for one indicator over all
+        years, z_values being a country x year array.
+        """
+        indicator = self.get(datatype)
+        return indicator.values[logscale], indicator.means[logscale], indicator.histograms[logscale]
+
+    def trend(self, datatype, logscale, max_points):
+        """
+        Returns (times, means) of one indicator, downsampled to at most
+        max_points points.
+        """
+        return self.get(datatype).trend(logscale, max_points)
+
+    def frame(self, datatype):
+        return self.get(datatype).df
+
+    def world(self, datatype, logscale, year):
+        """
+        Returns the (median, sum) over all countries for one indicator and year.
+        """
+        indicator = self.get(datatype)
+        j = self.year_index[year]
+        return indicator.medians[logscale][j], indicator.sums[logscale][j]
+
+    def continent_ranking(self, datatype, logscale, year, ascending=True):
+        """
+        Returns [(continent, value)] sorted by value, missing values last.
+        """
+        indicator = self.get(datatype)
+        j = self.year_index[year]
+        order = ranked(indicator.continent_order[logscale][j], indicator.continents_valid[logscale][j], ascending)
+        names = indicator.df_continent.index
+        values = indicator.continent_values[logscale][:, j]
+        return [(names[i], values[i]) for i in order]
+
+    def count(self, datatype, logscale, year):
+        """
+        Returns the number of countries with a value for one indicator and year.
+        """
+        return int(self.get(datatype).countries_valid[logscale][self.year_index[year]])
+
+    def first_year(self, datatype, logscale):
+        """
+        Returns the first year with values of an indicator (the first year if
+        there are none).
+        """
+        valid = np.flatnonzero(self.get(datatype).countries_valid[logscale])
+        return self.years[valid[0] if len(valid) else 0]
+
+    def select_range(self, datatype, logscale, year, low, high):
+        """
+        Returns the indices (into codes) of the countries with
+        low <= value <= high, by binary search in the sorted values.
+        """
+        indicator = self.get(datatype)
+        j = self.year_index[year]
+        values = indicator.sorted_values[logscale][j, :indicator.countries_valid[logscale][j]]
+        start = np.searchsorted(values, low, side='left')
+        stop = np.searchsorted(values, high, side='right')
+        return indicator.country_order[logscale][j, start:stop]
+
+    def top_countries(self, datatype, logscale, year, n, largest=True):
+        """
+        Returns [(country name, value)] of the n countries with the largest
+        (or smallest) values.
+        """
+        indicator = self.get(datatype)
+        j = self.year_index[year]
+        order = ranked(indicator.country_order[logscale][j], indicator.countries_valid[logscale][j], not largest)
+        values = indicator.values[logscale][:, j]
+        return [(self.names[i], values[i]) for i in order[:min(n, indicator.countries_valid[logscale][j])]]
+
+def get_data(max_resident=None):
+    """
+    DataCube of the registry; MAX_INDICATORS in the environment bounds how
+    many indicators stay loaded (default 16).
+    """
+    if max_resident is None:
+        max_resident = int(os.environ.get('MAX_INDICATORS', 16))
+    return DataCube(indicators, max_resident)
+
+class DataReloader:
+    """
+    Watches the sources of a DataCube and swaps in a new one when they change.
+    The swap is a single assignment of `cube`: callbacks that took the cube
+    before keep a consistent view of the old data. Indicators that changed
+    and were loaded are rebuilt before the swap, the others are carried
+    over, and listeners(cube, changed) are called after it (e.g. to
+    invalidate derived caches).
+    """
+    def __init__(self, cube, interval=60):
+        self.cube = cube
+        self.interval = interval
+        self.listeners = []
+        self._pending = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def reload(self):
+        """
+        Rebuilds the cube if its sources changed and were left unchanged
+        since the previous call (so that files being copied are not read).
+        Returns the changed datatypes.
+        """
+        with self._lock:
+            cube = self.cube
+            try:
+                sources = get_sources(cube.registry)
+            except (IOError, OSError):
+                return [] # files being replaced
+            changed = cube.changed(sources)
+            if not changed or sources != self._pending:
+                self._pending = sources if changed else None
+                return []
+            self._pending = None
+            new_cube = DataCube(cube.registry, cube.max_resident, previous=cube)
+            for key in cube.resident():
+                if key in changed:
+                    new_cube.get(key)
+            self.cube = new_cube
+        for listener in self.listeners:
+            listener(new_cube, changed)
+        return changed
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reload()
+            except Exception as e:
+                # keep serving the current data
+                print('Data reload failed: {!r}'.format(e), file=sys.stderr)
+
+    def start(self):
+        """
+        Starts watching in a daemon thread (once per process, as threads do
+        not survive a fork).
+        """
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='data-reloader', daemon=True)
+            self._thread.start()
+
+def get_reloader(cube, interval=None):
+    """
+    DataReloader of a cube; DATA_RELOAD_INTERVAL in the environment sets the
+    seconds between checks (default 60, 0 disables the watching).
+    """
+    if interval is None:
+        interval = float(os.environ.get('DATA_RELOAD_INTERVAL', 60))
+    return DataReloader(cube, interval)
 
 if __name__ == "__main__":
-    dfs, dfs_continents, codes, names = get_data()
\ No newline at end of file
+    # Build step: python data_utils.py
+    # Regenerating the country table: python data_utils.py countries
+    if sys.argv[1:] == ['countries']:
+        write_countries()
+    else:
+        write_snapshot()
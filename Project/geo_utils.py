@@ -0,0 +1,106 @@
+"""
+Self-hosted country geometry for the choropleth, so that browsers do not
+fetch plotly.js's topojson from its CDN (https://cdn.plot.ly/).
+
+Build step (e.g. at image build time):
+    python geo_utils.py [source URL or directory]
+downloads the world topojson at every resolution plotly.js supports into
+geo/, with precompressed gzip and brotli variants next to each file. The
+source can be a mirror or a vendored copy; if it is unreachable, a warning
+is printed and geo/ is left without geometry (the map then uses the CDN).
+"""
+import os
+import sys
+import gzip
+import hashlib
+import urllib.request
+from os.path import join as pjoin
+import flask
+
+geo_dir = 'geo'
+# geo.resolution values of plotly.js, coarsest first
+resolutions = [110, 50]
+encodings = {'br': '.br', 'gzip': '.gz'}
+
+def get_filename(resolution):
+    return 'world_{}m.json'.format(resolution)
+
+def read_source(source, filename, timeout=30):
+    if os.path.isdir(source):
+        with open(pjoin(source, filename), 'rb') as f:
+            return f.read()
+    with urllib.request.urlopen(source + filename, timeout=timeout) as response:
+        return response.read()
+
+def fetch_geometry(source='https://cdn.plot.ly/', path=geo_dir):
+    """
+    Fetches every resolution, or none: returns False, after a warning, if
+    one of them could not be read.
+    """
+    try:
+        files = {get_filename(resolution): read_source(source, get_filename(resolution))
+                 for resolution in resolutions}
+    except (IOError, OSError) as e:
+        print('Country geometry not fetched from {}, the map will use the CDN: {!r}'.format(source, e),
+              file=sys.stderr)
+        return False
+    os.makedirs(path, exist_ok=True)
+    for filename, data in files.items():
+        with open(pjoin(path, filename), 'wb') as f:
+            f.write(data)
+        with open(pjoin(path, filename + '.gz'), 'wb') as f:
+            f.write(gzip.compress(data, 9))
+        try:
+            import brotli
+            with open(pjoin(path, filename + '.br'), 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        except ImportError:
+            pass
+    return True
+
+def load_geometry(path=geo_dir):
+    """
+    Returns {filename: (etag, {encoding: data})} of the fetched files.
+    """
+    files = {}
+    for resolution in resolutions:
+        filename = get_filename(resolution)
+        if not os.path.exists(pjoin(path, filename)):
+            continue
+        with open(pjoin(path, filename), 'rb') as f:
+            variants = {'identity': f.read()}
+        for encoding, suffix in encodings.items():
+            if os.path.exists(pjoin(path, filename + suffix)):
+                with open(pjoin(path, filename + suffix), 'rb') as f:
+                    variants[encoding] = f.read()
+        files[filename] = ('"{}"'.format(hashlib.md5(variants['identity']).hexdigest()), variants)
+    return files
+
+def serve_geometry(server, url, path=geo_dir, max_age=30 * 24 * 3600):
+    """
+    Serves the fetched geometry at url + filename with ETags and a long
+    Cache-Control max-age. Returns False if there is none to serve.
+    """
+    files = load_geometry(path)
+    if not files:
+        return False
+
+    @server.route(url + '<filename>')
+    def geometry(filename):
+        if filename not in files:
+            flask.abort(404)
+        etag, variants = files[filename]
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding',
+                   'Cache-Control': 'public, max-age={}'.format(max_age)}
+        if etag in flask.request.headers.get('If-None-Match', ''):
+            return flask.Response(status=304, headers=headers)
+        accepted = flask.request.headers.get('Accept-Encoding', '')
+        encoding = next((encoding for encoding in encodings
+                         if encoding in variants and encoding in accepted), 'identity')
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return flask.Response(variants[encoding], mimetype='application/json', headers=headers)
+    return True
+
+if __name__ == "__main__":
+    fetch_geometry(*sys.argv[1:2])
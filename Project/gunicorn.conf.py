@@ -0,0 +1,29 @@
+# Production serving: gunicorn -c gunicorn.conf.py app:server
+#
+# The app is loaded once in the master process, which then loads the
+# indicators and runs the warm-up (app.preload), and the workers are forked
+# from it, so they share the data copy-on-write and start warm.
+import os
+import gc
+import multiprocessing
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 8050))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = True
+
+def when_ready(server):
+    # the app is preloaded at this point, the workers not forked yet
+    import app
+    app.preload()
+
+def pre_fork(server, worker):
+    # keep the garbage collector from touching (and so copying) the preloaded objects
+    gc.freeze()
+
+def post_worker_init(worker):
+    # data watching, and the warm-up after a reload, run in every worker
+    # (threads do not survive the fork)
+    import app
+    app.start()
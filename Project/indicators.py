@@ -0,0 +1,104 @@
+"""
+Registry of the World Bank indicators offered by the app.
+
+Every indicator lists:
+- directory: subdirectory of data/ holding its World Bank CSV export,
+- pattern: glob of the CSV file in it (the latest matching file is used),
+- label, description: texts shown in the app,
+- colorscale: name of a colorscale in app_utils.colorscales,
+- aggregate: how the world and continents are summarized, 'sum' (totals,
+  largest first) or 'median' (smallest first).
+Derived indicators list inputs (keys of other indicators) and an expression
+instead of directory and pattern: a function of the inputs' frames (country
+or continent x year) made of whole-frame operations, e.g.
+`lambda birth, death: birth - death`.
+Indicators are loaded (derived ones computed) lazily, the first time they are
+selected.
+"""
+
+indicators = {
+    'fertility': {
+        'directory': 'fertility-rate',
+        'pattern': 'API_SP.DYN.TFRT.IN_DS2_en_csv_v2_*.csv',
+        'label': "Fertility Rate",
+        'description': """
+    Fertility Rate is the number of children that would be born to a woman if
+    she were to live to the end of her childbearing years and
+    bear children in accordance with age-specific fertility
+    rates of the specified year.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'median',
+    },
+    'life': {
+        'directory': 'life-expectancy-at-birth',
+        'pattern': 'API_SP.DYN.LE00.IN_DS2_en_csv_v2_*.csv',
+        'label': "Life Expectancy",
+        'description': """
+    Life Expectancy is the number of years a newborn infant would live if prevailing
+    patterns of mortality at the time of its birth were to stay the
+    same throughout its life.
+    """,
+        'colorscale': 'reversed',
+        'aggregate': 'median',
+    },
+    'population': {
+        'directory': 'population',
+        'pattern': 'API_SP.POP.TOTL_DS2_en_csv_v2_*.csv',
+        'label': "Population",
+        'description': """
+    Population counts all residents regardless of legal status or
+    citizenship. The values are midyear estimates.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'sum',
+    },
+    'birth': {
+        'directory': 'birth-rate-crude',
+        'pattern': 'API_SP.DYN.CBRT.IN_DS2_en_csv_v2_*.csv',
+        'label': "Birth Rate",
+        'description': """
+    Birth Rate is the number of live births occurring during the year,
+    per 1,000 population estimated at midyear.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'median',
+    },
+    'death': {
+        'directory': 'death-rate-crude',
+        'pattern': 'API_SP.DYN.CDRT.IN_DS2_en_csv_v2_*.csv',
+        'label': "Death Rate",
+        'description': """
+    Death Rate is the number of deaths occurring during the year,
+    per 1,000 population estimated at midyear.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'median',
+    },
+    'natural_increase': {
+        'inputs': ['birth', 'death'],
+        'expression': lambda birth, death: birth - death,
+        'label': "Natural Increase",
+        'description': """
+    Natural Increase is the birth rate minus the death rate: the growth of
+    the population per 1,000 people, migration aside.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'median',
+    },
+    'population_growth': {
+        'inputs': ['population'],
+        'expression': lambda population: (population / population.shift(1, axis='columns') - 1) * 100,
+        'label': "Population Growth",
+        'description': """
+    Population Growth is the change of the population from the previous
+    year, in percent.
+    """,
+        'colorscale': 'default',
+        'aggregate': 'median',
+    },
+}
+
+# The country universe shared by all indicators: the countries with complete
+# data in every one of these (other indicators may have gaps, shown as NaN)
+universe = ['fertility', 'life', 'population', 'birth', 'death']
@@ -0,0 +1,84 @@
+import json
+import math
+import inspect
+import collections
+from functools import wraps
+import numpy as np
+import pandas as pd
+from dash import exceptions, no_update
+
+# Decimal places kept in the serialized figures: more than any hover label,
+# axis tick or colorbar of the app displays
+DISPLAY_DECIMALS = 4
+
+def to_builtin(obj, decimals=DISPLAY_DECIMALS):
+    """
+    Converts figures and components into plain lists/dicts/floats that the
+    C-accelerated json encoder handles, converting NumPy arrays as a whole and
+    rounding floats to `decimals` places (NaN and infinity become None,
+    datetimes ISO strings).
+    """
+    if isinstance(obj, (pd.Series, pd.Index)):
+        obj = obj.values
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f':
+            obj = np.round(obj, decimals)
+            if not np.isfinite(obj).all():
+                obj = np.where(np.isfinite(obj), obj, None)
+        elif obj.dtype.kind == 'M': # datetimes, as ISO strings for plotly
+            obj = np.datetime_as_string(obj, unit='auto')
+        return obj.tolist()
+    if isinstance(obj, np.datetime64):
+        return str(np.datetime_as_string(obj, unit='auto'))
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float):
+        return round(obj, decimals) if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: to_builtin(value, decimals) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_builtin(value, decimals) for value in obj]
+    if hasattr(obj, 'to_plotly_json'): # plotly graph objects and dash components
+        return to_builtin(obj.to_plotly_json(), decimals)
+    return obj
+
+def dumps(obj, decimals=DISPLAY_DECIMALS):
+    return json.dumps(to_builtin(obj, decimals), separators=(',', ':'), allow_nan=False)
+
+def get_outputs(callback_id):
+    """
+    Parses a callback id of app.callback_map: 'id.prop' or '..id1.prop1...id2.prop2..'.
+    """
+    if callback_id.startswith('..'):
+        return [tuple(output.rsplit('.', 1)) for output in callback_id[2:-2].split('...')]
+    return [tuple(callback_id.rsplit('.', 1))]
+
+def serialize_callbacks(app, callbacks, decimals=DISPLAY_DECIMALS):
+    """
+    Serializes the responses of the given Dash callbacks with `dumps` instead
+    of Dash's default encoder (plotly's PlotlyJSONEncoder, which converts
+    arrays element by element and encodes every response twice).
+    """
+    functions = [inspect.unwrap(callback) for callback in callbacks]
+    for callback_id, registration in app.callback_map.items():
+        func = inspect.unwrap(registration.get('callback', lambda: None))
+        if func not in functions:
+            continue
+        outputs = get_outputs(callback_id)
+        multi = callback_id.startswith('..')
+
+        @wraps(func)
+        def serialized(*args, func=func, outputs=outputs, multi=multi):
+            output_value = func(*args)
+            if multi:
+                response = collections.defaultdict(dict)
+                for (component_id, component_property), value in zip(outputs, output_value):
+                    if value is not no_update:
+                        response[component_id][component_property] = value
+                if not response:
+                    raise exceptions.PreventUpdate
+                return dumps({'response': response, 'multi': True}, decimals)
+            if output_value is no_update:
+                raise exceptions.PreventUpdate
+            return dumps({'response': {'props': {outputs[0][1]: output_value}}}, decimals)
+        registration['callback'] = serialized
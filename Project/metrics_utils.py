@@ -0,0 +1,118 @@
+import time
+import bisect
+import inspect
+import threading
+from functools import wraps
+
+# upper bounds of the histogram buckets
+latency_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+size_buckets = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+def format_labels(labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{}}} {}'.format(name, format_labels(labels + [('le', bound)]), cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, format_labels(labels), self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, format_labels(labels), cumulative))
+        return lines
+
+class Metrics:
+    """
+    Per-process metrics of the app in the Prometheus text format: latency and
+    response size histograms of the server-side callbacks, calls per
+    indicator, plus metrics read at scrape time (e.g. cache statistics).
+    """
+    def __init__(self, prefix='dataviz', datatypes=()):
+        self.prefix = prefix
+        self.datatypes = set(datatypes)
+        self.latencies = {}
+        self.sizes = {}
+        self.calls = {}
+        # name: (help, kind, function returning [(labels, value)])
+        self.collectors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, callback, args, seconds, size):
+        with self._lock:
+            if callback not in self.latencies:
+                self.latencies[callback] = Histogram(latency_buckets)
+                self.sizes[callback] = Histogram(size_buckets)
+            self.latencies[callback].observe(seconds)
+            self.sizes[callback].observe(size)
+            values = set(value for arg in args for value in (arg.values() if isinstance(arg, dict) else [arg])
+                         if isinstance(value, str))
+            for datatype in values & self.datatypes:
+                self.calls[(callback, datatype)] = self.calls.get((callback, datatype), 0) + 1
+
+    def collect(self, name, help, function, kind='gauge'):
+        """
+        Adds a metric whose samples, [(labels, value)], are returned by
+        function at scrape time.
+        """
+        self.collectors[name] = (help, kind, function)
+
+    def instrument(self, name, func):
+        """
+        Wraps a Dash callback (as registered in app.callback_map, i.e.
+        returning the serialized response) to record its calls.
+        """
+        @wraps(func)
+        def instrumented(*args):
+            start = time.perf_counter()
+            response = func(*args)
+            self.observe(name, args, time.perf_counter() - start, len(response))
+            return response
+        return instrumented
+
+    def render(self):
+        lines = []
+
+        def header(name, help, kind):
+            lines.append('# HELP {}_{} {}'.format(self.prefix, name, help))
+            lines.append('# TYPE {}_{} {}'.format(self.prefix, name, kind))
+
+        with self._lock:
+            header('callback_duration_seconds', 'Latency of the server-side callbacks.', 'histogram')
+            for callback, histogram in sorted(self.latencies.items()):
+                lines += histogram.lines(self.prefix + '_callback_duration_seconds', [('callback', callback)])
+            header('callback_response_bytes', 'Size of the serialized callback responses.', 'histogram')
+            for callback, histogram in sorted(self.sizes.items()):
+                lines += histogram.lines(self.prefix + '_callback_response_bytes', [('callback', callback)])
+            header('indicator_requests_total', 'Callback calls per indicator.', 'counter')
+            for (callback, datatype), count in sorted(self.calls.items()):
+                lines.append('{}_indicator_requests_total{{{}}} {}'.format(
+                    self.prefix, format_labels([('callback', callback), ('indicator', datatype)]), count))
+        for name, (help, kind, function) in sorted(self.collectors.items()):
+            header(name, help, kind)
+            for labels, value in function():
+                if labels:
+                    lines.append('{}_{}{{{}}} {}'.format(self.prefix, name, format_labels(labels), value))
+                else:
+                    lines.append('{}_{} {}'.format(self.prefix, name, value))
+        return '\n'.join(lines) + '\n'
+
+def instrument_callbacks(app, metrics, callbacks):
+    """
+    Records the calls of the given Dash callbacks, cached responses included.
+    """
+    functions = [inspect.unwrap(callback) for callback in callbacks]
+    for output, registration in app.callback_map.items():
+        if 'callback' in registration and inspect.unwrap(registration['callback']) in functions:
+            registration['callback'] = metrics.instrument(registration['callback'].__name__,
+                                                          registration['callback'])
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import builtins
+from contextlib import contextmanager
+
+class StartupProfile:
+    """
+    Startup profiling mode (PROFILE_STARTUP=1): records the time spent in
+    every import not yet loaded and in every loading phase, and prints them
+    with report(), which ends the profiling. Does nothing when disabled.
+    """
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.imports = [] # (depth, module, seconds)
+        self.phases = [] # (phase, seconds)
+        self._depth = 0
+        self._original_import = None
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def trace_imports(self, max_depth=2):
+        """
+        Times the imports made from now on, up to max_depth levels of nesting.
+        """
+        if not self.enabled or self._original_import is not None:
+            return
+        original_import = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules or self._depth >= max_depth:
+                return original_import(name, globals, locals, fromlist, level)
+            self._depth += 1
+            index = len(self.imports)
+            self.imports.append((self._depth, name, None))
+            start = time.perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                self.imports[index] = (self._depth + 1, name, time.perf_counter() - start)
+        builtins.__import__ = timed_import
+
+    def report(self, file=sys.stderr):
+        if not self.enabled:
+            return
+        # the rest of the life of the process is not profiled
+        self.enabled = False
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+        print('Startup profile ({:.0f} ms in total)'.format((time.perf_counter() - self.start) * 1000), file=file)
+        print('Imports:', file=file)
+        for depth, name, seconds in self.imports:
+            print('{}{:<30} {:8.1f} ms'.format('  ' * depth, name, seconds * 1000), file=file)
+        print('Loading phases:', file=file)
+        for name, seconds in self.phases:
+            print('  {:<30} {:8.1f} ms'.format(name, seconds * 1000), file=file)
+
+startup = StartupProfile(os.environ.get('PROFILE_STARTUP') == '1')
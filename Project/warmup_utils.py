@@ -0,0 +1,118 @@
+import os
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class WarmUp:
+    """
+    Precomputes the responses of the server-side callbacks over a grid of
+    input (and state) values, {(component id, property): [values]}, in a
+    background thread pool: the indicators get loaded and the response cache
+    filled while the server already accepts traffic. Values can also be given
+    by a function, called whenever the tasks are made (e.g. for values that
+    depend on the data version). Callbacks with an input outside the grid are
+    skipped.
+    Threads rather than processes, so that the loaded indicators and the
+    in-process caches are those of the worker serving the requests.
+    The callbacks are taken as registered when the WarmUp is created.
+    """
+    def __init__(self, callback_map, grid, threads=2):
+        self.callbacks = [([(c['id'], c['property']) for c in registration['inputs'] + registration.get('state', [])],
+                           registration['callback'])
+                          for registration in callback_map.values() if 'callback' in registration] # not clientside
+        self.grid = grid
+        self.threads = threads
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def tasks(self, datatypes=None):
+        """
+        Returns [(callback, args)] over the grid, optionally restricted to
+        some datatypes, the values of every datatype together.
+        """
+        grid = {i: values() if callable(values) else values for i, values in self.grid.items()}
+        if datatypes is not None:
+            grid[('datatype_dropdown', 'value')] = [datatype for datatype in grid[('datatype_dropdown', 'value')]
+                                                    if datatype in datatypes]
+        tasks = []
+        for inputs, callback in self.callbacks:
+            if not all(i in grid for i in inputs):
+                continue
+            for args in itertools.product(*[grid[i] for i in inputs]):
+                tasks.append((callback, args))
+        if ('datatype_dropdown', 'value') in grid:
+            datatypes = grid[('datatype_dropdown', 'value')]
+            tasks.sort(key=lambda task: min([datatypes.index(arg) for arg in task[1]
+                                             if isinstance(arg, str) and arg in datatypes] or [0]))
+        return tasks
+
+    def _run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+        with self._lock:
+            self.done += 1
+            if self.done == self.total:
+                self.finished = time.time()
+
+    def start(self, datatypes=None):
+        """
+        Queues the warm-up of the grid (or of some datatypes, e.g. after a
+        data reload) and returns at once.
+        """
+        tasks = self.tasks(datatypes)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='warmup')
+                self.started = time.time()
+            self.total += len(tasks)
+            self.finished = None
+        for callback, args in tasks:
+            self._executor.submit(self._run, callback, args)
+
+    def run(self, datatypes=None):
+        """
+        Warms up the grid (or some datatypes) and returns when done, e.g. in a
+        process about to fork: its pool is shut down before returning, as
+        the children would not inherit its threads.
+        """
+        tasks = self.tasks(datatypes)
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+            self.total += len(tasks)
+            self.finished = None
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='warmup') as executor:
+            for callback, args in tasks:
+                executor.submit(self._run, callback, args)
+
+    def progress(self):
+        with self._lock:
+            if self.started is None:
+                state = 'idle'
+            else:
+                state = 'done' if self.done == self.total else 'running'
+            return {
+                'state': state,
+                'done': self.done,
+                'total': self.total,
+                'failed': self.failed,
+                'seconds': ((self.finished or time.time()) - self.started) if self.started else 0.0,
+            }
+
+def get_warmup(callback_map, grid):
+    """
+    WarmUp configured from the environment: WARMUP=1 enables it,
+    WARMUP_THREADS (default 2) sets the size of its pool. None if disabled.
+    """
+    if os.environ.get('WARMUP', '0') != '1':
+        return None
+    return WarmUp(callback_map, grid, int(os.environ.get('WARMUP_THREADS', 2)))